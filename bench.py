@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import time
+
+import src.cfg as cfg
+
+# Benchmarks never touch the real cache, whatever MINEFIT_DB_URL is. Must be set before src.db creates engine
+cfg.DB_URL = cfg.BENCH_DB_URL
+
+from src.parser import Modrinth
+from src.ver_repo import VerRepo
+from src.mc_versions import GameVersionIndex
+from src.fake_modrinth import FakeModrinth
+from src.pack_gen import PackGenerator, SyntheticPack
+from src.schemas import VersionTreeDantic
+from src.tracing import start_trace, span
+from src.utility import logger
+import src.db as db
+
+MODES = ('cold', 'warm', 'partial')
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+async def _prepare_cache(pack: SyntheticPack, mode: str, warm_fraction: float) -> None:
+
+    """
+    Brings cache to the state required by benchmark mode.
+    Cold - empty cache, warm - whole pack is cached, partial - only first part of pack is cached.
+    """
+
+    await db.clear_cache()
+
+    if mode == 'warm':
+        await Modrinth.parse_projects(pack.urls())
+    elif mode == 'partial':
+        cached = pack.slugs[:max(1, int(len(pack.slugs) * warm_fraction))]
+        await Modrinth.parse_projects(pack.urls(cached))
+
+async def _measured_run(pack: SyntheticPack) -> dict:
+
+    with start_trace('bench') as trace:
+        started = time.perf_counter()
+        result = await Modrinth.parse_projects(pack.urls())
+        with span('response.encode'):
+            VersionTreeDantic(data=GameVersionIndex.compact_tree(result)).model_dump_json()
+        total_ms = (time.perf_counter() - started) * 1000
+
+    stages = {name: stat['total_ms'] for name, stat in trace.summary().items() if name != 'bench'}
+
+    return {'total_ms': total_ms, 'stages': stages}
+
+async def run_case(size: int, mode: str, args: argparse.Namespace) -> dict:
+
+    """
+    Runs Modrinth.parse_projects against fake upstream several times and aggregates timings
+
+    :param size: Count of projects in synthetic pack
+    :type size: int
+    :param mode: Cache mode, one of MODES
+    :type mode: str
+    :return: Aggregated case result
+    :rtype: dict
+    """
+
+    pack = PackGenerator(seed=args.seed).generate(size)
+    fake = FakeModrinth(
+        pack,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+    Modrinth.transport = fake.transport
+    VerRepo._transport = fake.transport
+    GameVersionIndex._transport = fake.transport
+    await GameVersionIndex.load()
+
+    runs = []
+    failures = []
+
+    for _ in range(args.repeat):
+        try:
+            await _prepare_cache(pack, mode, args.warm_fraction)
+            fake.reset_stats()
+            run = await _measured_run(pack)
+        except Exception as ex:
+            failures.append(f'{type(ex).__name__}: {ex}')
+            continue
+
+        run['upstream'] = fake.stats()
+        runs.append(run)
+
+    result = {
+        'size': size,
+        'mode': mode,
+        'versions': len(pack.versions),
+        'runs': len(runs),
+        'failures': failures,
+    }
+
+    if runs:
+        totals = [run['total_ms'] for run in runs]
+        stage_names = {name for run in runs for name in run['stages']}
+        result.update({
+            'median_ms': statistics.median(totals),
+            'min_ms': min(totals),
+            'max_ms': max(totals),
+            'stages_median_ms': {
+                name: statistics.median(run['stages'].get(name, 0.0) for run in runs) for name in sorted(stage_names)
+            },
+            'upstream': runs[-1]['upstream'],
+        })
+
+    return result
+
+def _load_history(path: str) -> list[dict]:
+
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def find_regressions(previous: dict | None, current: dict, threshold: float) -> list[str]:
+
+    """
+    Compares median timings with the previous run of benchmark with the same settings
+
+    :param threshold: Allowed relative slowdown, 0.2 means 20%
+    :type threshold: float
+    :return: Human readable regression descriptions
+    :rtype: list[str]
+    """
+
+    if previous is None:
+        return []
+
+    before = {(case['size'], case['mode']): case for case in previous['results'] if 'median_ms' in case}
+    regressions = []
+
+    for case in current['results']:
+        old = before.get((case['size'], case['mode']))
+        if old is None or 'median_ms' not in case:
+            continue
+        if case['median_ms'] > old['median_ms'] * (1 + threshold):
+            regressions.append(
+                f'{case["size"]} projects, {case["mode"]}: {old["median_ms"]:.1f} ms -> {case["median_ms"]:.1f} ms '
+                f'(baseline {previous["revision"]})'
+            )
+
+    return regressions
+
+async def main(args: argparse.Namespace) -> int:
+
+    logger.setLevel(logging.WARNING)
+
+    settings = {
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'rate_limit': args.rate_limit,
+        'error_rate': args.error_rate,
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'warm_fraction': args.warm_fraction,
+    }
+
+    results = []
+    for size in args.sizes:
+        for mode in args.modes:
+            case = await run_case(size, mode, args)
+            results.append(case)
+            if 'median_ms' in case:
+                print(f'{size:>5} projects {mode:>7}: median {case["median_ms"]:9.1f} ms  '
+                      f'upstream calls {sum(case["upstream"]["calls"].values()):>5}  failures {len(case["failures"])}')
+            else:
+                print(f'{size:>5} projects {mode:>7}: all {args.repeat} runs failed, {case["failures"][0]}')
+
+    await db.engine.dispose()
+
+    record = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': _git_revision(),
+        'settings': settings,
+        'results': results,
+    }
+
+    history = _load_history(args.history)
+    previous = next((item for item in reversed(history) if item['settings'] == settings), None)
+    regressions = find_regressions(previous, record, args.threshold)
+
+    for line in regressions:
+        print(f'REGRESSION {line}')
+
+    os.makedirs(os.path.dirname(args.history) or '.', exist_ok=True)
+    with open(args.history, 'a') as file:
+        file.write(json.dumps(record) + '\n')
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of Modrinth.parse_projects against local fake Modrinth API')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.05, help='Upstream latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random extra upstream latency in seconds')
+    parser.add_argument('--rate-limit', type=int, default=None, help='Upstream requests allowed per minute')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--warm-fraction', type=float, default=0.5, help='Cached share of pack in partial mode')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--history', default='cache/bench_history.jsonl')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown against previous run')
+    parser.add_argument('--fail-on-regression', action='store_true')
+
+    raise SystemExit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,32 @@
+import argparse
+import asyncio
+import time
+
+from src.db import engine
+from src.snapshot import export_snapshot, bulk_import, iter_snapshot, iter_raw_dump, open_text
+
+async def main(args: argparse.Namespace) -> None:
+
+    started = time.perf_counter()
+
+    if args.command == 'export':
+        counts = await export_snapshot(args.path, args.batch_size)
+    else:
+        parse = iter_snapshot if args.command == 'import' else iter_raw_dump
+        with open_text(args.path, 'r') as file:
+            counts = await bulk_import(parse(file), args.batch_size)
+
+    await engine.dispose()
+
+    print(f'{args.command}: {counts} in {time.perf_counter() - started:.1f} s')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline export and bulk import of versions cache. Target db is set by MINEFIT_DB_URL')
+    parser.add_argument('--batch-size', type=int, default=None, help='Rows per insert batch, cfg.IMPORT_BATCH_SIZE by default')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('export', help='Write cache snapshot').add_argument('path', help='Snapshot path, .jsonl or .jsonl.gz')
+    commands.add_parser('import', help='Load cache snapshot').add_argument('path')
+    commands.add_parser('import-raw', help='Load raw Modrinth API dump, one version or versions array per line').add_argument('path')
+
+    asyncio.run(main(parser.parse_args()))
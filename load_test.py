@@ -0,0 +1,329 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+
+from urllib.parse import urlencode
+
+import httpx
+import uvicorn
+
+import src.cfg as cfg
+
+# Load tests never touch the real cache, whatever MINEFIT_DB_URL is. Must be set before src.db creates engine
+cfg.DB_URL = cfg.LOAD_TEST_DB_URL
+
+from main import app
+from src.parser import Modrinth
+from src.ver_repo import VerRepo
+from src.mc_versions import GameVersionIndex
+from src.fake_modrinth import FakeModrinth
+from src.pack_gen import PackGenerator, SyntheticPack
+from src.tracing import start_trace
+from src.utility import logger
+import src.db as db
+
+# Same as DELAY_MS in static/index.js
+DEBOUNCE = 1.0
+# Same as MAX_QUERY_LENGTH in static/index.js
+MAX_QUERY_LENGTH = 4000
+
+class LoadStats:
+
+    def __init__(self) -> None:
+        self.requests: list[dict] = []
+        # Collected by the server side, only when app runs inside the harness
+        self.spans: dict[str, list[float]] = {'db.commit': [], 'ver_repo.cache_lookup': []}
+        self.server_errors: dict[str, int] = {}
+        self.locked_errors = 0
+
+    def record(self, scenario: str, method: str, latency_ms: float, status: int | None, error: str | None) -> None:
+        self.requests.append({
+            'scenario': scenario,
+            'method': method,
+            'latency_ms': latency_ms,
+            'status': status,
+            'error': error,
+        })
+
+def traced_app(stats: LoadStats):
+
+    """
+    Wraps app, so every request is traced on the server side and time spent in db can be separated from total latency.
+    Unhandled exceptions are counted, a client only sees them as HTTP 500.
+    """
+
+    async def wrapped(scope, receive, send):
+
+        if scope['type'] != 'http':
+            return await app(scope, receive, send)
+
+        with start_trace('load_test') as trace:
+            try:
+                await app(scope, receive, send)
+            except Exception as ex:
+                key = type(ex).__name__
+                stats.server_errors[key] = stats.server_errors.get(key, 0) + 1
+                if 'database is locked' in str(ex):
+                    stats.locked_errors += 1
+                raise
+            finally:
+                for item in trace.spans:
+                    if item.name in stats.spans:
+                        stats.spans[item.name].append(item.duration_ms)
+
+    return wrapped
+
+def _percentiles(values: list[float]) -> dict[str, float | None]:
+
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None, 'max': None}
+
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': ordered[-1]}
+
+async def _request(client: httpx.AsyncClient, text: str, etags: dict[str, str]) -> httpx.Response:
+
+    """
+    Same as requestProjects in static/index.js: short lists are sent with GET and revalidated with ETag
+    like a browser does with its HTTP cache, long ones are sent with POST
+    """
+
+    query = urlencode({'text': text})
+
+    if len(query) > MAX_QUERY_LENGTH:
+        return await client.post('/projects', json={'text': text})
+
+    url = f'/projects?{query}'
+    headers = {'If-None-Match': etags[url]} if url in etags else {}
+
+    response = await client.get(url, headers=headers)
+
+    if response.status_code == 200 and 'etag' in response.headers:
+        etags[url] = response.headers['etag']
+
+    return response
+
+async def _send(client: httpx.AsyncClient, text: str, scenario: str, stats: LoadStats, etags: dict[str, str]) -> None:
+
+    """
+    Sends one /projects request the same way static/index.js does and records its outcome.
+
+    :param etags: ETags of user responses by url, user's browser cache
+    :type etags: dict[str, str]
+    """
+
+    status = None
+    error = None
+    method = 'GET' if len(urlencode({'text': text})) <= MAX_QUERY_LENGTH else 'POST'
+    started = time.perf_counter()
+
+    try:
+        response = await _request(client, text, etags)
+        status = response.status_code
+    except Exception as ex:
+        error = f'{type(ex).__name__}: {ex}'.splitlines()[0]
+
+    stats.record(scenario, method, (time.perf_counter() - started) * 1000, status, error)
+
+async def paste_user(client: httpx.AsyncClient, pack: SyntheticPack, rng: random.Random, args: argparse.Namespace, stats: LoadStats) -> None:
+
+    """
+    User pastes a whole list at once, then comes back with the same list args.revisits times,
+    e.g. reloads the page. Revisits are answered with 304 while the list ETag is valid.
+    """
+
+    slugs = rng.sample(pack.slugs, rng.randint(args.min_pack, min(args.max_pack, len(pack.slugs))))
+    etags: dict[str, str] = {}
+
+    await _send(client, pack.urls(slugs), 'paste', stats, etags)
+
+    for _ in range(args.revisits):
+        await asyncio.sleep(rng.expovariate(1 / args.think_time))
+        await _send(client, pack.urls(slugs), 'revisit', stats, etags)
+
+async def edit_user(client: httpx.AsyncClient, pack: SyntheticPack, rng: random.Random, args: argparse.Namespace, stats: LoadStats) -> None:
+
+    """
+    User adds links one by one. Like the frontend, the list is sent debounce delay after an edit
+    if the next edit comes later than that, so the last edit is always sent.
+    Previous requests are not cancelled, so one user can have several requests in flight.
+    """
+
+    slugs = rng.sample(pack.slugs, rng.randint(args.min_pack, min(args.max_pack, len(pack.slugs))))
+    etags: dict[str, str] = {}
+    in_flight = []
+
+    for count in range(1, len(slugs) + 1):
+        # Link number count is added, pause is time until the next one
+        pause = rng.expovariate(1 / args.think_time) if count < len(slugs) else DEBOUNCE
+
+        if pause < DEBOUNCE:
+            await asyncio.sleep(pause)
+            continue
+
+        await asyncio.sleep(DEBOUNCE)
+        in_flight.append(asyncio.create_task(_send(client, pack.urls(slugs[:count]), 'edit', stats, etags)))
+        await asyncio.sleep(pause - DEBOUNCE)
+
+    await asyncio.gather(*in_flight)
+
+def build_report(stats: LoadStats, fake: FakeModrinth | None, wall_time: float, args: argparse.Namespace) -> dict:
+
+    requests = stats.requests
+    ok = [item for item in requests if item['status'] in (200, 304)]
+    gets = [item for item in requests if item['method'] == 'GET']
+    not_modified = [item for item in gets if item['status'] == 304]
+
+    errors: dict[str, int] = {}
+    for item in requests:
+        if item['status'] not in (200, 304):
+            key = item['error'] or f'HTTP {item["status"]}'
+            errors[key] = errors.get(key, 0) + 1
+
+    report = {
+        'settings': {key: value for key, value in vars(args).items() if key != 'output'},
+        'wall_time_s': wall_time,
+        'requests': len(requests),
+        'succeeded': len(ok),
+        'methods': {method: sum(1 for item in requests if item['method'] == method) for method in ('GET', 'POST')},
+        'not_modified': len(not_modified),
+        'not_modified_rate': len(not_modified) / len(gets) if gets else None,
+        'throughput_rps': len(requests) / wall_time if wall_time else 0.0,
+        'latency_ms': _percentiles([item['latency_ms'] for item in requests]),
+        'latency_ms_by_scenario': {
+            scenario: _percentiles([item['latency_ms'] for item in requests if item['scenario'] == scenario])
+            for scenario in sorted({item['scenario'] for item in requests})
+        },
+        'errors': errors,
+    }
+
+    if fake is not None:
+        upstream = fake.stats()
+        calls = sum(upstream['calls'].values())
+        report['upstream'] = upstream
+        report['amplification'] = {
+            'upstream_calls_per_request': calls / len(requests) if requests else None,
+            'version_ids_per_unique_id': (
+                upstream['ids_requested'].get('versions', 0) / upstream['unique_ids_requested']['versions']
+                if upstream['unique_ids_requested']['versions'] else None
+            ),
+        }
+
+    if args.url is None:
+        report['server_errors'] = stats.server_errors
+        report['sqlite'] = {
+            'locked_errors': stats.locked_errors,
+            'commit_ms': _percentiles(stats.spans['db.commit']),
+            'cache_lookup_ms': _percentiles(stats.spans['ver_repo.cache_lookup']),
+        }
+
+    return report
+
+async def _start_server(stats: LoadStats, port: int) -> tuple[uvicorn.Server, asyncio.Task, str]:
+
+    """
+    Starts uvicorn with traced app on localhost in the current event loop, so it uses fake upstream installed by the harness.
+    Server errors are counted in report instead of being logged.
+
+    :return: Running server, its serving task and base url
+    :rtype: tuple[uvicorn.Server, asyncio.Task, str]
+    """
+
+    server = uvicorn.Server(uvicorn.Config(traced_app(stats), host='127.0.0.1', port=port, log_level='critical', lifespan='off'))
+    serving = asyncio.create_task(server.serve())
+
+    while not server.started:
+        if serving.done():
+            serving.result()
+            raise RuntimeError('uvicorn exited before start')
+        await asyncio.sleep(0.01)
+
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+
+    return server, serving, f'http://127.0.0.1:{bound_port}'
+
+async def main(args: argparse.Namespace) -> dict:
+
+    logger.setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+
+    pack = PackGenerator(seed=args.seed).generate(args.pool)
+    stats = LoadStats()
+    fake = None
+    server = None
+
+    if args.url is None:
+        fake = FakeModrinth(pack, latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit, error_rate=args.error_rate, seed=args.seed)
+        Modrinth.transport = fake.transport
+        VerRepo._transport = fake.transport
+        GameVersionIndex._transport = fake.transport
+        if not args.warm:
+            await db.clear_cache()
+        server, serving, base_url = await _start_server(stats, args.port)
+    else:
+        base_url = args.url
+
+    # Every user is a separate browser with its own connections
+    client = httpx.AsyncClient(base_url=base_url, timeout=None, limits=httpx.Limits(max_connections=None))
+    users = []
+
+    started = time.perf_counter()
+
+    try:
+        async with client:
+            for _ in range(args.users):
+                scenario = edit_user if rng.random() < args.edit_share else paste_user
+                user_rng = random.Random(rng.random())
+                users.append(asyncio.create_task(scenario(client, pack, user_rng, args, stats)))
+                await asyncio.sleep(args.ramp / args.users)
+
+            await asyncio.gather(*users)
+    finally:
+        wall_time = time.perf_counter() - started
+        if server is not None:
+            server.should_exit = True
+            await serving
+            await db.engine.dispose()
+
+    return build_report(stats, fake, wall_time, args)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test of /projects endpoint with simultaneous users')
+    parser.add_argument(
+        '--url', default=None,
+        help='Drive an already running server, e.g. http://127.0.0.1:8000, instead of the local one. '
+             'That server talks to the real api.modrinth.com, so load goes to Modrinth, and report has no upstream and sqlite sections. '
+             'By default the harness starts the app with uvicorn on 127.0.0.1 against fake upstream'
+    )
+    parser.add_argument('--port', type=int, default=0, help='Port of the local server, random free port by default')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--ramp', type=float, default=5.0, help='Seconds over which users arrive')
+    parser.add_argument('--edit-share', type=float, default=0.5, help='Share of users typing links one by one')
+    parser.add_argument('--think-time', type=float, default=0.7, help='Mean pause between edits in seconds')
+    parser.add_argument('--revisits', type=int, default=1, help='Times every pasting user resends the same list')
+    parser.add_argument('--pool', type=int, default=200, help='Count of projects users pick their packs from')
+    parser.add_argument('--min-pack', type=int, default=5)
+    parser.add_argument('--max-pack', type=int, default=40)
+    parser.add_argument('--warm', action='store_true', help='Keep existing cache instead of starting cold')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--rate-limit', type=int, default=None)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='Write JSON report to file instead of stdout')
+
+    parsed = parser.parse_args()
+    result = asyncio.run(main(parsed))
+
+    if parsed.output:
+        with open(parsed.output, 'w') as file:
+            json.dump(result, file, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
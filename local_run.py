@@ -1,6 +1,15 @@
 from src.parser import Modrinth
-import asyncio
+from src.tracing import start_trace
+import asyncio, sys
 
 if __name__ == '__main__':
     projects = open('projects.txt', 'r').read()
-    result = asyncio.run(Modrinth.parse_projects(projects))
\ No newline at end of file
+
+    if len(sys.argv) > 1:
+        try:
+            with start_trace('local_run') as trace:
+                result = asyncio.run(Modrinth.parse_projects(projects))
+        finally:
+            trace.save(sys.argv[1])
+    else:
+        result = asyncio.run(Modrinth.parse_projects(projects))
@@ -1,12 +1,20 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
 
-from src.schemas import ProjectsList
+from src.schemas import ProjectsList, ProjectsQuery, VersionTreeDantic
 from src.parser import Modrinth
+from src.tracing import start_trace
+from src.manifest import iter_manifest_hashes
+from src.mc_versions import GameVersionIndex
+import src.response as response
+import src.cfg as cfg
 
-import json
+import zipfile
+from tempfile import SpooledTemporaryFile
+from typing import Annotated, Literal
 
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -20,7 +28,97 @@ async def main(request: Request):
         {"request": request}
     )
 
+async def _parse(data: ProjectsList, request: Request, trace: Literal['chrome', 'otlp'] | None) -> Response:
+
+    if trace is not None and not cfg.TRACING_ENABLED:
+        raise HTTPException(status_code=403, detail='Tracing is disabled')
+
+    await GameVersionIndex.load()
+
+    media_type = response.negotiate(request.headers.get('accept'))
+    etag = response.project_set_etag(data, media_type)
+
+    if request.method == 'GET' and trace is None and response.is_not_modified(request.headers.get('if-none-match'), etag):
+        return response.not_modified(etag)
+
+    project_set = data.project_set()
+
+    if not project_set:
+        return response.encode(VersionTreeDantic(data={}), media_type, etag)
+
+    if data.hashes:
+        parsing = Modrinth.parse_hashes(project_set, data.algorithm)
+    else:
+        parsing = Modrinth.parse_projects('\n'.join(project_set))
+
+    trace_id = None
+
+    if trace is None:
+        result = await parsing
+    else:
+        # Failed requests are the ones worth tracing, so trace is saved in any case
+        try:
+            with start_trace('projects') as request_trace:
+                result = await parsing
+        finally:
+            await run_in_threadpool(request_trace.save, trace)
+        trace_id = request_trace.trace_id
+
+    tree = VersionTreeDantic(data=GameVersionIndex.compact_tree(result), trace=trace_id)
+
+    return response.encode(tree, media_type, etag)
+
+@app.get('/projects')
+async def projects_conditional(request: Request, data: Annotated[ProjectsQuery, Query()]):
+
+    """
+    Same as POST /projects, but supports conditional requests with If-None-Match
+    """
+
+    return await _parse(data, request, data.trace)
+
 @app.post('/projects')
-async def projects(data: ProjectsList):
-    result = await Modrinth.parse_projects(data.text)
-    return {'status': 'ok', 'data': json.dumps(result)}
\ No newline at end of file
+async def projects(request: Request, data: ProjectsList, trace: Literal['chrome', 'otlp'] | None = None):
+    return await _parse(data, request, trace)
+
+@app.get('/game_versions')
+async def game_versions():
+
+    """
+    Releases from oldest to newest, needed to expand ranges in versions tree
+    """
+
+    await GameVersionIndex.load()
+    return {'status': 'ok', 'data': GameVersionIndex.releases()}
+
+@app.post('/projects/manifest')
+async def projects_manifest(request: Request, trace: Literal['chrome', 'otlp'] | None = None):
+
+    """
+    Accepts .mrpack archive or modrinth.index.json as raw request body, up to cfg.MANIFEST_MAX_SIZE bytes
+    """
+
+    too_large = HTTPException(status_code=413, detail=f'Manifest is larger than {cfg.MANIFEST_MAX_SIZE} bytes')
+
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > cfg.MANIFEST_MAX_SIZE:
+        raise too_large
+
+    with SpooledTemporaryFile(max_size=cfg.MANIFEST_SPOOL_SIZE) as file:
+        size = 0
+        # Content-Length can be missing with chunked encoding, so the body is counted too
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > cfg.MANIFEST_MAX_SIZE:
+                raise too_large
+            file.write(chunk)
+        file.seek(0)
+
+        try:
+            # Unzipping and parsing are blocking, they must not stall other requests
+            hashes = await run_in_threadpool(lambda: list(iter_manifest_hashes(file)))
+            data = ProjectsList(hashes=hashes)
+        except (ValueError, KeyError, zipfile.BadZipFile) as ex:
+            raise HTTPException(status_code=422, detail=str(ex))
+
+    return await _parse(data, request, trace)
@@ -1,4 +1,25 @@
+import os
+
 DEBUG=1
 COLLECTION_SEGMENT_SIZE=20
 MAX_CONCURRENT_REQUESTS = 5
-KEEP_ALIVE_CONNECTION = 5
\ No newline at end of file
+KEEP_ALIVE_CONNECTION = 5
+TRACE_DIR = 'cache/traces'
+# Allows clients to request traces with ?trace=, every traced request writes a file into TRACE_DIR.
+# Enabled with MINEFIT_TRACING=1 on the node where a slow request has to be captured
+TRACING_ENABLED = os.environ.get('MINEFIT_TRACING', '').lower() in ('1', 'true', 'yes')
+DB_URL = os.environ.get('MINEFIT_DB_URL', 'sqlite+aiosqlite:///cache/modrinth.db')
+# Scratch dbs of bench.py and load_test.py, the only ones db.clear_cache is allowed to wipe
+BENCH_DB_URL = 'sqlite+aiosqlite:///cache/bench.db'
+LOAD_TEST_DB_URL = 'sqlite+aiosqlite:///cache/load_test.db'
+IMPORT_BATCH_SIZE = 5000
+# Hashes per POST /v2/version_files body
+BULK_SEGMENT_SIZE = 500
+# Ids per GET /v2/projects, ids go into query string that must stay under 8 KB request line limits
+PROJECT_IDS_SEGMENT_SIZE = 100
+MANIFEST_SPOOL_SIZE = 8 * 1024 * 1024
+# Larger manifest uploads are rejected with 413
+MANIFEST_MAX_SIZE = 256 * 1024 * 1024
+GAME_VERSIONS_TTL = 24 * 60 * 60
+GAME_VERSIONS_RETRY = 60
+ETAG_TTL = 60 * 60
\ No newline at end of file
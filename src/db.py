@@ -2,18 +2,22 @@ from typing import Collection, overload
 
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
 
 from src.utility import log
+import src.cfg as cfg
+from src.tracing import span
 
 from src.schemas import *
 import asyncio
+from more_itertools import chunked
 
 class VerStack:
     def __init__(self) -> None:
         self.parsed: dict[str, VersionDantic] = {}
         self.invalid: dict[str,InvalidVersionDantic] = {}
 
-engine = create_async_engine('sqlite+aiosqlite:///cache/modrinth.db', echo=False)
+engine = create_async_engine(cfg.DB_URL, echo=False)
 Session = async_sessionmaker(engine)
 
 async def init_db():
@@ -23,6 +27,20 @@ async def init_db():
 
 asyncio.run(init_db())
 
+async def clear_cache() -> None:
+
+    """
+    Deletes every cached version. Used by benchmarks to start from cold cache,
+    so it refuses to run on any db except scratch dbs of benchmarks and load tests.
+    """
+
+    if cfg.DB_URL not in (cfg.BENCH_DB_URL, cfg.LOAD_TEST_DB_URL):
+        raise RuntimeError(f'Refusing to clear cache outside of benchmark dbs: {cfg.DB_URL}')
+
+    async with engine.begin() as conn:
+        for table in reversed(BaseORM.metadata.sorted_tables):
+            await conn.execute(table.delete())
+
 async def enrich_ver_stack(ids: Collection[str] | str, ver_stack: VerStack) -> None:
 
     """
@@ -33,54 +51,92 @@ async def enrich_ver_stack(ids: Collection[str] | str, ver_stack: VerStack) -> N
     if not isinstance(ids, Collection):
         ids = [ids]
 
-    async with Session() as session:
+    with span('db.enrich_ver_stack', ids=len(ids)) as db_span:
+        async with Session() as session:
+
+            parsed_stmt = select(VersionORM).where(VersionORM.id.in_(ids))
+            invalid_stmt = select(InvalidVersionORM).where(InvalidVersionORM.id.in_(ids))
 
-        parsed_stmt = select(VersionORM).where(VersionORM.id.in_(ids))
-        invalid_stmt = select(InvalidVersionORM).where(InvalidVersionORM.id.in_(ids))
+            parsed_result = await session.scalars(parsed_stmt)
+            invalid_result = await session.scalars(invalid_stmt)
 
-        parsed_result = await session.scalars(parsed_stmt)
-        invalid_result = await session.scalars(invalid_stmt)
+            parsed_orm = parsed_result.all()
+            invalid_orm = invalid_result.all()
 
-        parsed_orm = parsed_result.all()
-        invalid_orm = invalid_result.all()
+            for ver in parsed_orm:
+                model = VersionDantic.model_validate(ver)
+                ver_stack.parsed[model.id] = model
 
-        for ver in parsed_orm:
-            model = VersionDantic.model_validate(ver)
-            ver_stack.parsed[model.id] = model
+            for ver in invalid_orm:
+                model = InvalidVersionDantic.model_validate(ver)
+                ver_stack.invalid[model.id] = model
 
-        for ver in invalid_orm:
-            model = InvalidVersionDantic.model_validate(ver)
-            ver_stack.invalid[model.id] = model
+        db_span.set(parsed_hits=len(parsed_orm), invalid_hits=len(invalid_orm))
 
-async def _dantic_to_orm(data: list[VersionDantic | InvalidVersionDantic]) -> list[VersionORM | InvalidVersionORM]:
+async def _dantic_to_rows(data: list[VersionDantic | InvalidVersionDantic]) -> tuple[list[dict], list[dict]]:
 
-    result = []
+    parsed = []
+    invalid = []
 
     for obj in data:
         if isinstance(obj, VersionDantic):
-            result.append(VersionORM(**obj.model_dump()))
+            parsed.append(obj.model_dump())
         else:
-            result.append(InvalidVersionORM(**obj.model_dump()))
+            invalid.append(obj.model_dump())
 
-    return result
+    return parsed, invalid
 
 async def add_versions_to_session(session: AsyncSession, data_dantic: VersionDantic | InvalidVersionDantic | list[VersionDantic | InvalidVersionDantic] | None) -> None:
 
+    """
+    Inserts versions into session. Versions that are already cached are skipped,
+    stack may contain them when they were loaded from db or requested again as dependencies.
+    """
+
     if not data_dantic:
         return
 
     if not isinstance(data_dantic, Collection):
         data_dantic = [data_dantic]
 
-    data_orm = await _dantic_to_orm(data_dantic)
+    parsed_rows, invalid_rows = await _dantic_to_rows(data_dantic)
 
-    session.add_all(data_orm)
+    if parsed_rows:
+        await session.execute(insert(VersionORM).on_conflict_do_nothing(), parsed_rows)
+    if invalid_rows:
+        await session.execute(insert(InvalidVersionORM).on_conflict_do_nothing(), invalid_rows)
 
     log(f'Added data to session')
 
+async def get_version_files(hashes: Collection[str]) -> dict[str, str]:
+
+    """
+    Returns cached versions ids of given files hashes
+    """
+
+    result: dict[str, str] = {}
+
+    async with Session() as session:
+        for segment in chunked(hashes, cfg.BULK_SEGMENT_SIZE):
+            rows = await session.execute(
+                select(VersionFileORM.hash, VersionFileORM.version_id).where(VersionFileORM.hash.in_(segment))
+            )
+            result.update(rows.all())
+
+    return result
+
+async def add_version_files_to_session(session: AsyncSession, files: dict[str, str]) -> None:
+
+    if not files:
+        return
+
+    rows = [{'hash': file_hash, 'version_id': version_id} for file_hash, version_id in files.items()]
+    await session.execute(insert(VersionFileORM).on_conflict_do_nothing(), rows)
+
 async def commit_changes(session: AsyncSession) -> None:
 
-    await session.flush()
-    await session.commit()
+    with span('db.commit'):
+        await session.flush()
+        await session.commit()
 
     log(f'Commit done')
\ No newline at end of file
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import random
+import time
+
+from collections import Counter
+
+import httpx
+
+from src.pack_gen import SyntheticPack, GAME_VERSIONS
+
+# Same as limits of httpx.AsyncClient created without explicit limits
+DEFAULT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+class FakeModrinth:
+
+    """
+    Local stand-in for Modrinth API used by benchmarks and load tests.
+    Serves synthetic pack data through httpx.MockTransport with configurable latency, rate limit and error rate.
+    """
+
+    def __init__(
+        self,
+        pack: SyntheticPack,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        rate_limit: int | None = None,
+        rate_window: float = 60.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.pack = pack
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.error_rate = error_rate
+
+        self._random = random.Random(seed)
+        self._projects_by_id = {project['id']: project for project in pack.projects.values()}
+        self._versions_by_hash = {
+            file_hash: ver
+            for ver in pack.versions.values()
+            for file in ver.get('files', [])
+            for file_hash in file['hashes'].values()
+        }
+        self._window_start = time.monotonic()
+        self._window_calls = 0
+
+        self.calls: Counter[str] = Counter()
+        self.ids_requested: Counter[str] = Counter()
+        self.unique_ids: dict[str, set[str]] = {'projects': set(), 'versions': set(), 'hashes': set()}
+        self.errors = 0
+        self.rate_limited = 0
+
+    def reset_stats(self) -> None:
+        self.calls.clear()
+        self.ids_requested.clear()
+        for ids in self.unique_ids.values():
+            ids.clear()
+        self.errors = 0
+        self.rate_limited = 0
+
+    def stats(self) -> dict:
+        return {
+            'calls': dict(self.calls),
+            'ids_requested': dict(self.ids_requested),
+            'unique_ids_requested': {key: len(ids) for key, ids in self.unique_ids.items()},
+            'errors': self.errors,
+            'rate_limited': self.rate_limited,
+        }
+
+    def transport(self, limits: httpx.Limits | None = None) -> httpx.MockTransport:
+
+        """
+        Creates transport for one client. httpx ignores limits of a client with custom transport,
+        so its connection pool is emulated here: at most max_connections requests of the client are served at once.
+
+        :param limits: Limits of the client, httpx defaults if not given
+        :type limits: httpx.Limits | None
+        """
+
+        max_connections = (limits or DEFAULT_LIMITS).max_connections
+
+        if max_connections is None:
+            return httpx.MockTransport(self.handle)
+
+        pool = asyncio.Semaphore(max_connections)
+
+        async def handle(request: httpx.Request) -> httpx.Response:
+            async with pool:
+                return await self.handle(request)
+
+        return httpx.MockTransport(handle)
+
+    def _rate_limit_exceeded(self) -> bool:
+
+        if self.rate_limit is None:
+            return False
+
+        now = time.monotonic()
+        if now - self._window_start >= self.rate_window:
+            self._window_start = now
+            self._window_calls = 0
+
+        self._window_calls += 1
+
+        return self._window_calls > self.rate_limit
+
+    def _projects(self, request: httpx.Request) -> list[dict]:
+
+        ids = json.loads(request.url.params['ids'])
+        self.ids_requested['projects'] += len(ids)
+        self.unique_ids['projects'].update(ids)
+
+        result = []
+        for key in ids:
+            project = self.pack.projects.get(key) or self._projects_by_id.get(key)
+            if project:
+                result.append(project)
+        return result
+
+    def _versions(self, request: httpx.Request) -> list[dict]:
+
+        ids = json.loads(request.url.params['ids'])
+        self.ids_requested['versions'] += len(ids)
+        self.unique_ids['versions'].update(ids)
+
+        return [self.pack.versions[key] for key in ids if key in self.pack.versions]
+
+    def _version_files(self, request: httpx.Request) -> dict[str, dict]:
+
+        hashes = json.loads(request.content)['hashes']
+        self.ids_requested['hashes'] += len(hashes)
+        self.unique_ids['hashes'].update(hashes)
+
+        return {file_hash: self._versions_by_hash[file_hash] for file_hash in hashes if file_hash in self._versions_by_hash}
+
+    def _game_versions(self, request: httpx.Request) -> list[dict]:
+
+        # Modrinth returns tags from newest to oldest
+        return [
+            {'version': version, 'version_type': 'release', 'date': f'{2020 + index // 12}-{index % 12 + 1:02d}-01T00:00:00Z', 'major': version.count('.') == 1}
+            for index, version in reversed(list(enumerate(GAME_VERSIONS)))
+        ]
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+
+        path = request.url.path
+        self.calls[path] += 1
+
+        await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+
+        if self._rate_limit_exceeded():
+            self.rate_limited += 1
+            return httpx.Response(
+                429,
+                json={'error': 'ratelimited', 'description': 'You are being rate-limited'},
+                headers={'X-Ratelimit-Limit': str(self.rate_limit), 'X-Ratelimit-Remaining': '0'},
+            )
+
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            return httpx.Response(500, json={'error': 'internal_error', 'description': 'Synthetic upstream error'})
+
+        routes = {
+            '/v2/projects': self._projects,
+            '/v2/versions': self._versions,
+            '/v2/version_files': self._version_files,
+            '/v2/tag/game_version': self._game_versions,
+        }
+
+        if path not in routes:
+            return httpx.Response(404, json={'error': 'not_found', 'description': path})
+
+        return httpx.Response(200, json=routes[path](request))
@@ -0,0 +1,148 @@
+import io
+import json
+import zipfile
+
+from typing import Any, BinaryIO, Iterator, TextIO
+
+MRPACK_INDEX = 'modrinth.index.json'
+ZIP_MAGIC = b'PK\x03\x04'
+NUMBER_CHARS = frozenset('0123456789+-.eE')
+
+class ManifestReader:
+
+    """
+    Incremental reader of modrinth.index.json.
+    Only top level keys are decoded as a whole, entries of "files" array are yielded one by one,
+    so memory does not depend on pack size.
+    """
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, stream: TextIO, chunk_size: int = 64 * 1024) -> None:
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+
+        if self._eof:
+            return False
+
+        chunk = self._stream.read(self._chunk_size)
+
+        if not chunk:
+            self._eof = True
+            return False
+
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+
+        return True
+
+    def _peek(self) -> str:
+
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of manifest')
+
+    def _expect(self, chars: str) -> str:
+
+        char = self._peek()
+
+        if char not in chars:
+            raise ValueError(f'Expected one of {chars!r} in manifest, got {char!r}')
+
+        self._pos += 1
+
+        return char
+
+    def _value(self) -> Any:
+
+        self._peek()
+
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+
+            # Number cut by the end of buffer is decoded partially, e.g. "1." as 1, so it is decoded again with the next chunk
+            if all(char in NUMBER_CHARS for char in self._buffer[end:]) and self._fill():
+                continue
+
+            self._pos = end
+
+            return value
+
+    def iter_files(self) -> Iterator[dict]:
+
+        """
+        Yields entries of "files" array: {"path": ..., "hashes": {"sha1": ..., "sha512": ...}, ...}
+        """
+
+        self._expect('{')
+
+        if self._peek() == '}':
+            return
+
+        while True:
+            key = self._value()
+            self._expect(':')
+
+            if key == 'files':
+                self._expect('[')
+                if self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._expect(',]') == ']':
+                            break
+            else:
+                self._value()
+
+            if self._expect(',}') == '}':
+                return
+
+def iter_manifest_hashes(file: BinaryIO, algorithm: str = 'sha1') -> Iterator[str]:
+
+    """
+    Yields files hashes from .mrpack archive or bare modrinth.index.json
+
+    :param file: Seekable binary file with pack or index
+    :type file: BinaryIO
+    :param algorithm: Hash algorithm, sha1 or sha512
+    :type algorithm: str
+    :return: Hashes of pack files
+    :rtype: Iterator[str]
+    """
+
+    is_zip = file.read(len(ZIP_MAGIC)) == ZIP_MAGIC
+    file.seek(0)
+
+    if is_zip:
+        with zipfile.ZipFile(file) as archive, archive.open(MRPACK_INDEX) as index:
+            yield from _hashes(io.TextIOWrapper(index, encoding='utf-8-sig'), algorithm)
+    else:
+        stream = io.TextIOWrapper(file, encoding='utf-8-sig')
+        try:
+            yield from _hashes(stream, algorithm)
+        finally:
+            # Caller owns the file, wrapper must not close it
+            stream.detach()
+
+def _hashes(stream: TextIO, algorithm: str) -> Iterator[str]:
+
+    for entry in ManifestReader(stream).iter_files():
+        try:
+            yield entry['hashes'][algorithm].lower()
+        except (KeyError, TypeError, AttributeError):
+            raise ValueError(f'Manifest file without {algorithm} hash: {entry}')
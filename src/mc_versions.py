@@ -0,0 +1,161 @@
+import asyncio
+import contextvars
+import time
+
+from typing import Callable, Iterable
+
+import httpx
+
+import src.cfg as cfg
+from src.tracing import span
+from src.utility import log
+
+RANGE_SEPARATOR = '–'
+
+class GameVersionIndex:
+
+    """
+    Canonical order of Minecraft releases, pulled from Modrinth game version tags.
+    Used to collapse consecutive releases into ranges like 1.20–1.20.6.
+    Snapshots, pre-releases and versions missing in index are never collapsed and are listed separately.
+    """
+
+    _api_url = 'https://api.modrinth.com/v2/tag/game_version'
+    _timeout = httpx.Timeout(5.0)
+
+    # Replaced by benchmarks with a local fake of Modrinth API. Called with limits of every created client
+    _transport: Callable[..., httpx.AsyncBaseTransport] | None = None
+
+    _releases: list[str] = []
+    _position: dict[str, int] = {}
+    _expires_at: float = 0.0
+
+    # Only one refresh at a time, concurrent requests wait for it or keep using previous index
+    _lock = asyncio.Lock()
+    _refresh_task: asyncio.Task | None = None
+
+    @classmethod
+    def set_releases(cls, releases: list[str]) -> None:
+
+        """
+        Replaces index with given releases, ordered from oldest to newest
+        """
+
+        cls._releases = list(releases)
+        cls._position = {version: index for index, version in enumerate(cls._releases)}
+
+    @classmethod
+    async def load(cls) -> None:
+
+        """
+        Refreshes index if it is expired. Without index requests wait for the first load,
+        expired index is refreshed in background and used meanwhile, so requests never wait for Modrinth.
+        If Modrinth is unavailable, previous index is kept and retried later.
+        """
+
+        if time.monotonic() < cls._expires_at:
+            return
+
+        if not cls._releases:
+            await cls._refresh()
+            return
+
+        if cls._refresh_task is None or cls._refresh_task.done():
+            # Own context: refresh must not be recorded into trace of the request that triggered it
+            cls._refresh_task = asyncio.create_task(cls._refresh(), context=contextvars.Context())
+
+    @classmethod
+    async def _refresh(cls) -> None:
+
+        async with cls._lock:
+            # Index could be loaded while waiting for the lock
+            if time.monotonic() < cls._expires_at:
+                return
+            await cls._fetch()
+
+    @classmethod
+    async def _fetch(cls) -> None:
+
+        try:
+            async with httpx.AsyncClient(timeout=cls._timeout, transport=cls._transport() if cls._transport else None) as client:
+                with span('game_versions.request') as request_span:
+                    response = await client.get(cls._api_url)
+                    request_span.set(status=response.status_code)
+            response.raise_for_status()
+            tags = response.json()
+        except (httpx.HTTPError, ValueError) as ex:
+            log(f'Game versions index unavailable: {ex}', True)
+            cls._expires_at = time.monotonic() + cfg.GAME_VERSIONS_RETRY
+            return
+
+        releases = sorted(
+            (tag for tag in tags if tag.get('version_type') == 'release'),
+            key=lambda tag: tag['date']
+        )
+        cls.set_releases([tag['version'] for tag in releases])
+        cls._expires_at = time.monotonic() + cfg.GAME_VERSIONS_TTL
+
+        log(f'Game versions index has {len(cls._releases)} releases')
+
+    @classmethod
+    def revision(cls) -> str:
+
+        """
+        Short identifier of index state. Ranges depend on index, so it is a part of response ETag
+        """
+
+        return f'{len(cls._releases)}:{cls._releases[-1] if cls._releases else ""}'
+
+    @classmethod
+    def releases(cls) -> list[str]:
+        return list(cls._releases)
+
+    @classmethod
+    def to_ranges(cls, versions: Iterable[str]) -> list[str]:
+
+        """
+        Collapses game versions into ranges of consecutive releases
+
+        :param versions: Game versions
+        :type versions: Iterable[str]
+        :return: Releases and release ranges from oldest to newest, followed by versions missing in index
+        :rtype: list[str]
+        """
+
+        versions = set(versions)
+        positions = sorted(cls._position[version] for version in versions if version in cls._position)
+
+        result = []
+        start = end = None
+
+        for position in positions:
+            if end is not None and position == end + 1:
+                end = position
+                continue
+            if start is not None:
+                result.append(cls._format_range(start, end))
+            start = end = position
+
+        if start is not None:
+            result.append(cls._format_range(start, end))
+
+        result.extend(sorted(version for version in versions if version not in cls._position))
+
+        return result
+
+    @classmethod
+    def _format_range(cls, start: int, end: int) -> str:
+
+        if start == end:
+            return cls._releases[start]
+
+        return f'{cls._releases[start]}{RANGE_SEPARATOR}{cls._releases[end]}'
+
+    @classmethod
+    def compact_tree(cls, tree: dict[str, dict[str, set[str]]]) -> dict[str, list[str]]:
+
+        """
+        Converts versions tree into loader -> game versions ranges
+        """
+
+        return {loader: cls.to_ranges(game_versions) for loader, game_versions in sorted(tree.items())}
@@ -0,0 +1,177 @@
+import hashlib
+import random
+
+GAME_VERSIONS = [
+    '1.16', '1.16.1', '1.16.2', '1.16.3', '1.16.4', '1.16.5',
+    '1.17', '1.17.1',
+    '1.18', '1.18.1', '1.18.2',
+    '1.19', '1.19.1', '1.19.2', '1.19.3', '1.19.4',
+    '1.20', '1.20.1', '1.20.2', '1.20.3', '1.20.4', '1.20.5', '1.20.6',
+    '1.21', '1.21.1', '1.21.2', '1.21.3', '1.21.4',
+]
+
+MOD_LOADERS = ['fabric', 'forge', 'neoforge', 'quilt']
+SHADER_LOADERS = ['iris', 'optifine']
+RESOURCEPACK_LOADERS = ['minecraft']
+
+class SyntheticPack:
+
+    def __init__(self) -> None:
+        self.projects: dict[str, dict] = {}
+        self.versions: dict[str, dict] = {}
+        self.slugs: list[str] = []
+
+    def urls(self, slugs: list[str] | None = None) -> str:
+
+        """
+        Returns pack in the same format user sends to /projects: Modrinth urls divided by rows
+        """
+
+        slugs = self.slugs if slugs is None else slugs
+        return '\n'.join(f'https://modrinth.com/{self.projects[slug]["project_type"]}/{slug}' for slug in slugs)
+
+class PackGenerator:
+
+    """
+    Generates synthetic Modrinth projects and versions with fan-out close to real packs:
+    most projects are mods, a few library mods are required by many others, version counts are long-tailed.
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        library_share: float = 0.05,
+        max_dependencies: int = 3,
+        null_dependency_rate: float = 0.05,
+        invalid_version_rate: float = 0.02,
+    ) -> None:
+        self._random = random.Random(seed)
+        self.library_share = library_share
+        self.max_dependencies = max_dependencies
+        self.null_dependency_rate = null_dependency_rate
+        self.invalid_version_rate = invalid_version_rate
+
+    def _id(self, prefix: str, number: int) -> str:
+        return hashlib.sha1(f'{prefix}{number}'.encode()).hexdigest()[:8]
+
+    def _versions_count(self) -> int:
+        return min(150, max(1, int(self._random.lognormvariate(2.8, 0.8))))
+
+    def _make_version(self, pack: SyntheticPack, project: dict, number: int, libraries: list[dict]) -> dict:
+
+        first = self._random.randrange(len(GAME_VERSIONS))
+        game_versions = GAME_VERSIONS[first:first + self._random.randint(1, 4)]
+        loaders = self._random.sample(project['loaders'], self._random.randint(1, len(project['loaders'])))
+
+        version_id = self._id(project['id'], number)
+
+        dependencies = []
+        if project['project_type'] == 'mod' and libraries:
+            for library in self._random.sample(libraries, min(len(libraries), self._random.randint(0, self.max_dependencies))):
+                if library['id'] == project['id']:
+                    continue
+                dep_version = self._random.choice(library['versions'])
+                if self._random.random() < self.null_dependency_rate:
+                    dep_version = None
+                dependencies.append({
+                    'version_id': dep_version,
+                    'project_id': library['id'],
+                    'file_name': None,
+                    'dependency_type': 'required',
+                })
+
+        sha1 = hashlib.sha1(version_id.encode()).hexdigest()
+        sha512 = hashlib.sha512(version_id.encode()).hexdigest()
+
+        version = {
+            'id': version_id,
+            'project_id': project['id'],
+            'name': f'{project["title"]} {number}',
+            'version_number': f'{number}.0.0',
+            'dependencies': dependencies,
+            'game_versions': game_versions,
+            'version_type': self._random.choice(['release', 'release', 'release', 'beta', 'alpha']),
+            'loaders': loaders,
+            'status': 'listed',
+            'date_published': f'2024-01-{number % 28 + 1:02d}T00:00:00Z',
+            'files': [{
+                'hashes': {'sha1': sha1, 'sha512': sha512},
+                'url': f'https://cdn.modrinth.com/data/{project["id"]}/versions/{version_id}/{project["slug"]}.jar',
+                'filename': f'{project["slug"]}-{number}.jar',
+                'primary': True,
+                'size': self._random.randint(10_000, 5_000_000),
+            }],
+        }
+
+        if self._random.random() < self.invalid_version_rate:
+            del version['date_published']
+
+        pack.versions[version_id] = version
+
+        return version
+
+    def _make_project(self, pack: SyntheticPack, number: int, project_type: str, libraries: list[dict]) -> dict:
+
+        loaders = {
+            'mod': MOD_LOADERS,
+            'shader': SHADER_LOADERS,
+            'resourcepack': RESOURCEPACK_LOADERS,
+        }[project_type]
+
+        project_id = self._id('project', number)
+        slug = f'{project_type}-{number}'
+
+        project = {
+            'id': project_id,
+            'slug': slug,
+            'title': slug.replace('-', ' ').title(),
+            'description': f'Synthetic {project_type}',
+            'body': '',
+            'client_side': 'required',
+            'server_side': 'optional',
+            'project_type': project_type,
+            'game_versions': [],
+            'loaders': self._random.sample(loaders, self._random.randint(1, len(loaders))),
+            'versions': [],
+            'updated': '2024-01-01T00:00:00Z',
+        }
+
+        versions = [self._make_version(pack, project, index, libraries) for index in range(self._versions_count())]
+        project['versions'] = [ver['id'] for ver in versions]
+        project['game_versions'] = sorted({game_ver for ver in versions for game_ver in ver['game_versions']}, key=GAME_VERSIONS.index)
+
+        pack.projects[slug] = project
+
+        return project
+
+    def generate(self, size: int) -> SyntheticPack:
+
+        """
+        Generates pack with given count of user projects.
+        Library mods are generated first, some of them are outside of the pack and only reachable as dependencies.
+
+        :param size: Count of projects in pack
+        :type size: int
+        :return: Pack with raw API data of projects and versions
+        :rtype: SyntheticPack
+        """
+
+        pack = SyntheticPack()
+
+        # Libraries are referenced by version ids, so they are generated before dependants
+        libraries_count = max(1, int(size * self.library_share))
+        libraries = [self._make_project(pack, number, 'mod', []) for number in range(libraries_count * 2)]
+
+        # Half of libraries is a part of the pack, like fabric-api usually is
+        pack.slugs.extend(library['slug'] for library in libraries[:libraries_count])
+
+        number = len(libraries)
+        while len(pack.slugs) < size:
+            project_type = self._random.choices(['mod', 'shader', 'resourcepack'], weights=[80, 8, 12])[0]
+            project = self._make_project(pack, number, project_type, libraries)
+            pack.slugs.append(project['slug'])
+            number += 1
+
+        pack.slugs = pack.slugs[:size]
+
+        return pack
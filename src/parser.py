@@ -1,6 +1,6 @@
 import asyncio, httpx, json
 
-from typing import Any
+from typing import Any, Callable
 
 from pydantic import ValidationError
 
@@ -8,6 +8,7 @@ import src.cfg as cfg
 from src.schemas import ProjectDantic, InvalidProjectDantic
 from src.ver_repo import *
 from src.utility import *
+from src.tracing import span
 
 from more_itertools import chunked
 from copy import deepcopy
@@ -20,11 +21,14 @@ class ModrinthProjectStack:
         self.resources: list[ProjectDantic] = []
 
         self.versions_tree: dict[str, dict[str, set[str]]] = {}
+        # Version id -> project id of every version in tree, tree is checked by projects count
+        self.version_projects: dict[str, str] = {}
 
     def _mods_to_tree(self) -> None:
         
         for project in self.mods:
             for ver in project.parsed_versions:
+                self.version_projects[ver.id] = project.id
                 for loader in ver.loaders:
                     
                     if loader not in self.versions_tree.keys():
@@ -35,33 +39,35 @@ class ModrinthProjectStack:
                         if game_ver not in self.versions_tree[loader]:
                             self.versions_tree[loader][game_ver] = set()
 
-                        self.versions_tree[loader][game_ver].update(ver.id)
+                        self.versions_tree[loader][game_ver].add(ver.id)
 
     def _shaders_to_tree(self) -> None:
 
         for project in self.shaders:
             for ver in project.parsed_versions:
-                
+                self.version_projects[ver.id] = project.id
+
                 for loader in self.versions_tree.keys():
                     for game_ver in ver.game_versions:
 
                         if game_ver not in self.versions_tree[loader]:
                             self.versions_tree[loader][game_ver] = set()
 
-                        self.versions_tree[loader][game_ver].update(ver.id)
+                        self.versions_tree[loader][game_ver].add(ver.id)
 
     def _resources_to_tree(self) -> None:
 
         for project in self.resources:
             for ver in project.parsed_versions:
-                
+                self.version_projects[ver.id] = project.id
+
                 for loader in self.versions_tree.keys():
                     for game_ver in ver.game_versions:
 
                         if game_ver not in self.versions_tree[loader]:
                             self.versions_tree[loader][game_ver] = set()
 
-                        self.versions_tree[loader][game_ver].update(ver.id)
+                        self.versions_tree[loader][game_ver].add(ver.id)
 
     def make_ver_tree(self) -> dict[str, dict[str, set[str]]]:
         
@@ -80,15 +86,22 @@ class Modrinth:
     timeout = httpx.Timeout(5.0, connect=5.0)
     project_api_url = 'https://api.modrinth.com/v2/projects'
 
+    # Replaced by benchmarks with a local fake of Modrinth API. Called with limits of every created client
+    transport: Callable[..., httpx.AsyncBaseTransport] | None = None
+
     @classmethod
     async def _single_segment_request(cls, client: httpx.AsyncClient, slug_list: list[str]) -> list[dict]:
 
         json_string = json.dumps(slug_list)
 
-        response = await client.get(
-            cls.project_api_url,
-            params={"ids": json_string}
-        )
+        with span('modrinth.segment_request', ids=len(slug_list)) as request_span:
+
+            response = await client.get(
+                cls.project_api_url,
+                params={"ids": json_string}
+            )
+
+            request_span.set(status=response.status_code)
 
         try:
             response.raise_for_status()
@@ -113,12 +126,28 @@ class Modrinth:
         slug_list = [url.rsplit('/', 1)[1] for url in projects.split('\n')]
 
         log(f'{len(slug_list)} projects')
-        
-        projects_slugs_segmented = list(chunked(slug_list, cfg.COLLECTION_SEGMENT_SIZE))
 
-        async with httpx.AsyncClient(timeout=cls.timeout) as client:
+        return await cls._request_projects_by_ids(slug_list, cfg.COLLECTION_SEGMENT_SIZE)
+
+    @classmethod
+    async def _request_projects_by_ids(cls, ids: list[str], segment_size: int) -> list[list[dict]]:
+
+        """
+        Requests projects info by ids or slugs with async batch requests
+
+        :param ids: Projects ids or slugs
+        :type ids: list[str]
+        :param segment_size: Count of projects in one request
+        :type segment_size: int
+        :return: Segmented list with requsts results
+        :rtype: list[list[dict]]
+        """
+
+        projects_ids_segmented = list(chunked(ids, segment_size))
+
+        async with httpx.AsyncClient(timeout=cls.timeout, transport=cls.transport() if cls.transport else None) as client:
             results = await asyncio.gather(
-                *(cls._single_segment_request(client, segment) for segment in projects_slugs_segmented)
+                *(cls._single_segment_request(client, segment) for segment in projects_ids_segmented)
             )
 
         return results
@@ -192,17 +221,19 @@ class Modrinth:
                 stack.shaders.append(project)
 
     @classmethod
-    def final_check(cls, user_projects_count: int, parsed_projects_json: dict[str, dict[str, set[str]]], acceptable_fail_count: int = 0) -> dict[str, dict[str, set[str]]]:
+    def final_check(cls, user_projects_count: int, parsed_projects_json: dict[str, dict[str, set[str]]], version_projects: dict[str, str], acceptable_fail_count: int = 0) -> dict[str, dict[str, set[str]]]:
         
         """
-        Iterate through every loader and game version combination in parsed projects and check if it has enough parsed versions.
-        If loader and game_version has equal or higher parsed versions then projects offered by user, than combination is considered valid.
+        Iterate through every loader and game version combination in parsed projects and check if it has enough projects with parsed versions.
+        If loader and game_version has versions of equal or higher count of projects then projects offered by user, than combination is considered valid.
         In other case combination deletes. If loader has zero game versions, it deletes
         
         :param user_projects_count: Count of projects that offered by user and successfully validated
         :type user_projects_count: int
         :param parsed_projects_json: Versions tree
         :type parsed_projects_json: dict[str, dict[str, list[str]]]
+        :param version_projects: Project id of every version in tree
+        :type version_projects: dict[str, str]
         :return: Versions tree after count check
         :rtype: dict[str, dict[str, list[str]]]
         """
@@ -210,7 +241,9 @@ class Modrinth:
         for loader in deepcopy(parsed_projects_json):
             for game_ver in deepcopy(parsed_projects_json[loader]):
                 
-                if len(parsed_projects_json[loader][game_ver]) < user_projects_count - acceptable_fail_count:
+                projects = {version_projects[ver_id] for ver_id in parsed_projects_json[loader][game_ver]}
+
+                if len(projects) < user_projects_count - acceptable_fail_count:
                     del parsed_projects_json[loader][game_ver]
 
             if len(parsed_projects_json[loader].keys()) <= 0:
@@ -230,17 +263,89 @@ class Modrinth:
         :rtype: dict
         """
         
-        results = await cls._request_projects(projects_urls)
-        valid_projs, failed_projs = cls._validate_projects(results)
+        with span('modrinth.request_projects'):
+            results = await cls._request_projects(projects_urls)
+
+        with span('modrinth.validate_projects') as validate_span:
+            valid_projs, failed_projs = cls._validate_projects(results)
+            validate_span.set(valid=len(valid_projs), failed=len(failed_projs))
+
+        with span('modrinth.enrich_versions'):
+            await cls._enrich_projects_with_versions(valid_projs)
+
+        return cls._projects_to_tree(valid_projs)
+
+    @classmethod
+    async def parse_hashes(cls, hashes: list[str], algorithm: str = 'sha1') -> dict[str, dict[str, set[str]]]:
+
+        """
+        Same as `parse_projects`, but projects are given by files hashes, e.g. from modpack manifest.
+        Every project keeps only the exact versions of given files, so full versions crawl is not needed.
+        Files that are unknown to Modrinth or resolve to invalid versions still count as required projects,
+        like projects without valid versions in `parse_projects`, so the tree never claims pack works without them.
+
+        :param hashes: Files hashes
+        :type hashes: list[str]
+        :param algorithm: Hash algorithm, sha1 or sha512
+        :type algorithm: str
+        :return: Versions tree
+        :rtype: dict
+        """
+
+        with span('modrinth.resolve_hashes', hashes=len(hashes)) as resolve_span:
+            ver_stack, files = await VerRepo.get_by_hashes(hashes, algorithm)
+            resolve_span.set(resolved=len(files))
+
+        log(f'{len(hashes) - len(files)} files not found on Modrinth')
+
+        file_versions = [ver_stack.parsed[ver_id] for ver_id in set(files.values()) if ver_id in ver_stack.parsed]
+        project_ids = list({ver.project_id for ver in file_versions})
+
+        with span('modrinth.request_projects', ids=len(project_ids)):
+            results = await cls._request_projects_by_ids(project_ids, cfg.PROJECT_IDS_SEGMENT_SIZE)
+
+        with span('modrinth.validate_projects') as validate_span:
+            valid_projs, failed_projs = cls._validate_projects(results)
+            validate_span.set(valid=len(valid_projs), failed=len(failed_projs))
+
+        versions_by_project: dict[str, list[VersionDantic]] = {}
+        for ver in file_versions:
+            versions_by_project.setdefault(ver.project_id, []).append(ver)
+
+        for proj in valid_projs:
+            proj.parsed_versions = versions_by_project.get(proj.id, [])
+
+        valid_ids = {proj.id for proj in valid_projs}
+        unusable = [
+            file_hash for file_hash in hashes
+            if files.get(file_hash) not in ver_stack.parsed or ver_stack.parsed[files[file_hash]].project_id not in valid_ids
+        ]
+
+        if unusable:
+            log(f'{len(unusable)} files are unknown or have invalid versions, they are counted as unsupported projects')
+
+        return cls._projects_to_tree(valid_projs, len(unusable))
+
+    @classmethod
+    def _projects_to_tree(cls, valid_projs: list[ProjectDantic], unusable_count: int = 0) -> dict[str, dict[str, set[str]]]:
+
+        """
+        Builds versions tree of projects and keeps loaders and game versions supported by all of them
+
+        :param unusable_count: Count of requested projects or files that have no valid versions and are not in valid_projs
+        :type unusable_count: int
+        """
 
-        await cls._enrich_projects_with_versions(valid_projs)
-        
         projects_stack = ModrinthProjectStack()
         cls._enrich_stack_with_projects(projects_stack, valid_projs)
 
-        json_result = projects_stack.make_ver_tree()
+        with span('tree.make_ver_tree') as tree_span:
+            json_result = projects_stack.make_ver_tree()
+            tree_span.set(loaders=len(json_result))
 
-        final_list = cls.final_check(len(valid_projs), json_result)
+        with span('tree.final_check') as check_span:
+            final_list = cls.final_check(len(valid_projs) + unusable_count, json_result, projects_stack.version_projects)
+            check_span.set(loaders=len(final_list), game_versions=sum(len(vers) for vers in final_list.values()))
 
         return final_list
             
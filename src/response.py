@@ -0,0 +1,122 @@
+import hashlib
+import json
+import time
+
+from fastapi import Response
+
+import src.cfg as cfg
+from src.mc_versions import GameVersionIndex
+from src.schemas import ProjectsList, VersionTreeDantic
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_TYPE = 'application/json'
+MSGPACK_TYPE = 'application/msgpack'
+MSGPACK_ALIASES = (MSGPACK_TYPE, 'application/x-msgpack')
+
+def _media_ranges(accept: str) -> list[tuple[str, float]]:
+
+    """
+    Parses Accept header into (media range, quality) pairs, malformed quality counts as q=0
+    """
+
+    ranges = []
+
+    for item in accept.split(','):
+        media_range, *params = [part.strip() for part in item.split(';')]
+        if not media_range:
+            continue
+
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        ranges.append((media_range.lower(), quality))
+
+    return ranges
+
+def _quality(ranges: list[tuple[str, float]], media_type: str) -> float:
+
+    """
+    Quality of media type given by the most specific matching range, 0 if no range matches
+    """
+
+    wildcards = {media_type: 2, f'{media_type.split("/")[0]}/*': 1, '*/*': 0}
+    specificity, quality = -1, 0.0
+
+    for media_range, range_quality in ranges:
+        if media_range in wildcards and wildcards[media_range] > specificity:
+            specificity, quality = wildcards[media_range], range_quality
+
+    return quality
+
+def negotiate(accept: str | None) -> str:
+
+    """
+    Chooses response encoding by Accept header. msgpack is optional, without it JSON is always used.
+    msgpack is only sent when client names it explicitly with quality not lower than JSON, wildcards keep JSON.
+    """
+
+    if msgpack is None or not accept:
+        return JSON_TYPE
+
+    ranges = _media_ranges(accept)
+    msgpack_quality = max((quality for media_range, quality in ranges if media_range in MSGPACK_ALIASES), default=0.0)
+
+    if msgpack_quality > 0 and msgpack_quality >= _quality(ranges, JSON_TYPE):
+        return MSGPACK_TYPE
+
+    return JSON_TYPE
+
+def project_set_etag(data: ProjectsList, media_type: str) -> str:
+
+    """
+    ETag of versions tree response. Depends on requested projects set, game versions index and encoding.
+    Expires every cfg.ETAG_TTL seconds, so new versions published on Modrinth reach clients.
+    """
+
+    key = json.dumps([
+        data.project_set(),
+        data.algorithm if data.hashes else None,
+        GameVersionIndex.revision(),
+        media_type,
+        int(time.time() // cfg.ETAG_TTL),
+    ])
+
+    return f'"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+def is_not_modified(if_none_match: str | None, etag: str) -> bool:
+
+    if not if_none_match:
+        return False
+
+    candidates = [item.strip().removeprefix('W/') for item in if_none_match.split(',')]
+
+    return '*' in candidates or etag in candidates
+
+def _headers(etag: str) -> dict[str, str]:
+    return {'ETag': etag, 'Vary': 'Accept', 'Cache-Control': 'no-cache'}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=_headers(etag))
+
+def encode(tree: VersionTreeDantic, media_type: str, etag: str) -> Response:
+
+    """
+    Serializes versions tree response with chosen encoding
+    """
+
+    if media_type == MSGPACK_TYPE:
+        content = msgpack.packb(tree.model_dump(exclude_none=True))
+    else:
+        content = tree.model_dump_json(exclude_none=True)
+
+    return Response(content, media_type=media_type, headers=_headers(etag))
@@ -1,8 +1,8 @@
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import String, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from pydantic import BaseModel, field_validator
-from typing import Optional
+from pydantic import BaseModel, field_validator, model_validator
+from typing import Literal, Optional
 import re
 
 BaseORM = declarative_base()
@@ -63,6 +63,19 @@ class InvalidVersionORM(BaseORM):
         primary_key=True,
     )
 
+class VersionFileORM(BaseORM):
+
+    __tablename__ = 'version_files'
+
+    hash: Mapped[str] = mapped_column(
+        String,
+        primary_key=True,
+    )
+
+    version_id: Mapped[str] = mapped_column(
+        String
+    )
+
 class ProjectDantic(BaseModel):
     id: str
     slug: str
@@ -133,8 +146,15 @@ class InvalidVersionDantic(BaseModel):
         'extra': 'ignore'
     }
 
+class VersionTreeDantic(BaseModel):
+    status: str = 'ok'
+    data: dict[str, list[str]]
+    trace: str | None = None
+
 class ProjectsList(BaseModel):
-    text: str
+    text: str = ''
+    hashes: list[str] = []
+    algorithm: Literal['sha1', 'sha512'] = 'sha1'
 
     @field_validator('text')
     def validate_links(cls, text: str):
@@ -150,4 +170,39 @@ class ProjectsList(BaseModel):
             if len(matches) > 1 or len(matches) < 1:
                 raise ValueError
         
-        return text
\ No newline at end of file
+        return text
+
+    @field_validator('hashes')
+    def lowercase_hashes(cls, hashes: list[str]):
+
+        # Hex hashes are case insensitive, lowercase is the form stored in cache and used in ETag
+        return [file_hash.lower() for file_hash in hashes]
+
+    @model_validator(mode='after')
+    def validate_hashes(self):
+
+        HASH_LENGTH = {'sha1': 40, 'sha512': 128}
+        HEX = re.compile('[0-9a-f]+')
+
+        if self.hashes and self.text.strip():
+            raise ValueError('Send either projects urls or files hashes')
+
+        for file_hash in self.hashes:
+            if len(file_hash) != HASH_LENGTH[self.algorithm] or not HEX.fullmatch(file_hash):
+                raise ValueError(f'Invalid {self.algorithm} hash {file_hash}')
+
+        return self
+
+    def project_set(self) -> list[str]:
+
+        """
+        Returns requested projects in canonical form: same set of projects gives same list regardless of order and duplicates
+        """
+
+        if self.hashes:
+            return sorted(set(self.hashes))
+
+        return sorted({row.strip().rstrip('/') for row in self.text.splitlines() if row.strip()})
+
+class ProjectsQuery(ProjectsList):
+    trace: Literal['chrome', 'otlp'] | None = None
@@ -0,0 +1,276 @@
+import gzip
+import json
+
+from typing import Any, Iterable, Iterator, TextIO
+
+from sqlalchemy import Table, select, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+import src.cfg as cfg
+from src.db import engine
+from src.schemas import BaseORM, VersionORM, InvalidVersionORM, VersionFileORM
+from src.utility import log
+
+SNAPSHOT_FORMAT = 'minefit-cache'
+SNAPSHOT_VERSION = 1
+
+_VERSION_STR_FIELDS = ('id', 'name', 'version_type', 'status', 'date_published', 'project_id')
+_VERSION_LIST_FIELDS = ('game_versions', 'loaders')
+
+def open_text(path: str, mode: str) -> TextIO:
+
+    """
+    Opens snapshot file, gzip compressed if path ends with .gz
+    """
+
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+async def export_snapshot(path: str, batch_size: int | None = None) -> dict[str, int]:
+
+    """
+    Streams cached versions into JSON Lines snapshot.
+    Every table starts with header line {"table": name, "columns": [...]}, followed by one array per row.
+
+    :param path: Snapshot path, gzip compressed if it ends with .gz
+    :type path: str
+    :return: Exported rows count by table
+    :rtype: dict[str, int]
+    """
+
+    batch_size = batch_size or cfg.IMPORT_BATCH_SIZE
+    counts: dict[str, int] = {}
+
+    with open_text(path, 'w') as file:
+        file.write(_dumps({'format': SNAPSHOT_FORMAT, 'version': SNAPSHOT_VERSION}) + '\n')
+
+        async with engine.connect() as conn:
+            for table in BaseORM.metadata.sorted_tables:
+                columns = [column.name for column in table.columns]
+                file.write(_dumps({'table': table.name, 'columns': columns}) + '\n')
+                counts[table.name] = 0
+
+                result = await conn.stream(select(table).execution_options(yield_per=batch_size))
+                async for rows in result.partitions(batch_size):
+                    file.writelines(_dumps(list(row)) + '\n' for row in rows)
+                    counts[table.name] += len(rows)
+
+    log(f'Exported {counts} to {path}')
+
+    return counts
+
+def iter_snapshot(lines: Iterable[str]) -> Iterator[tuple[str, dict]]:
+
+    """
+    Parses snapshot lines into (table name, row) pairs
+    """
+
+    table: str | None = None
+    columns: list[str] = []
+
+    for line in lines:
+        if not line.strip():
+            continue
+
+        data = json.loads(line)
+
+        if isinstance(data, dict):
+            if 'format' in data:
+                if data['format'] != SNAPSHOT_FORMAT or data['version'] > SNAPSHOT_VERSION:
+                    raise ValueError(f'Unsupported snapshot {data["format"]} v{data["version"]}')
+                continue
+            table, columns = data['table'], data['columns']
+            continue
+
+        if table is None:
+            raise ValueError('Snapshot row before table header')
+
+        yield table, dict(zip(columns, data))
+
+def _raw_files_rows(ver: dict, ver_id: str) -> Iterator[tuple[str, dict]]:
+
+    files = ver.get('files')
+    if not isinstance(files, list):
+        return
+
+    for file in files:
+        hashes = file.get('hashes') if isinstance(file, dict) else None
+        if not isinstance(hashes, dict):
+            continue
+        for file_hash in hashes.values():
+            if isinstance(file_hash, str):
+                yield VersionFileORM.__tablename__, {'hash': file_hash.lower(), 'version_id': ver_id}
+
+def raw_version_to_rows(ver: Any) -> Iterator[tuple[str, dict]]:
+
+    """
+    Converts raw Modrinth API version into table rows without pydantic.
+    Mirrors VersionDantic validation: version with missing or mistyped fields, or with dependency
+    without version id, goes to invalid versions. Versions with invalid dependencies are moved
+    to invalid versions by bulk_import, after the whole dump is loaded.
+    Hashes of version files are yielded as version_files rows, so hash lookups hit the cache.
+
+    :param ver: Version object from /v2/versions or /v2/version_files response
+    :type ver: Any
+    :return: Table name and row pairs
+    :rtype: Iterator[tuple[str, dict]]
+    """
+
+    if not isinstance(ver, dict):
+        yield InvalidVersionORM.__tablename__, {'id': 'null'}
+        return
+
+    ver_id = ver.get('id', 'null')
+
+    if isinstance(ver_id, str):
+        yield from _raw_files_rows(ver, ver_id)
+
+    invalid = (InvalidVersionORM.__tablename__, {'id': ver_id})
+
+    for field in _VERSION_STR_FIELDS:
+        if not isinstance(ver.get(field), str):
+            yield invalid
+            return
+
+    for field in _VERSION_LIST_FIELDS:
+        value = ver.get(field)
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            yield invalid
+            return
+
+    dependencies = ver.get('dependencies')
+    if not isinstance(dependencies, list):
+        yield invalid
+        return
+
+    dep_ids = []
+    for dep in dependencies:
+        if isinstance(dep, str):
+            dep_ids.append(dep)
+            continue
+        if not isinstance(dep, dict) or 'version_id' not in dep:
+            continue
+        if not isinstance(dep['version_id'], str):
+            yield invalid
+            return
+        dep_ids.append(dep['version_id'])
+
+    row = {field: ver[field] for field in _VERSION_STR_FIELDS + _VERSION_LIST_FIELDS}
+    row['dependencies'] = dep_ids
+
+    yield VersionORM.__tablename__, row
+
+def iter_raw_dump(lines: Iterable[str]) -> Iterator[tuple[str, dict]]:
+
+    """
+    Parses raw API dump. Every line is a version object, a whole saved /v2/versions response (array of versions)
+    or a whole saved /v2/version_files response (object of file hash -> version).
+    """
+
+    for line in lines:
+        if not line.strip():
+            continue
+
+        data = json.loads(line)
+
+        if isinstance(data, list):
+            versions = data
+        elif isinstance(data, dict) and 'id' not in data and data and all(isinstance(ver, dict) for ver in data.values()):
+            # Hashes of keys are also in files of versions
+            versions = list(data.values())
+        else:
+            versions = [data]
+
+        for ver in versions:
+            yield from raw_version_to_rows(ver)
+
+# Same invariant as VerRepo._filter_invalid_vers_by_deps, applied to the whole cache at once
+_MOVE_INVALID_DEPENDENTS = text('''
+    INSERT OR IGNORE INTO invalid_versions (id)
+    SELECT v.id FROM versions v
+    WHERE EXISTS (
+        SELECT 1 FROM json_each(v.dependencies) dep
+        JOIN invalid_versions i ON i.id = dep.value
+    )
+''')
+_DELETE_INVALID_VERSIONS = text('DELETE FROM versions WHERE id IN (SELECT id FROM invalid_versions)')
+
+async def _invalidate_dependents(conn: AsyncConnection) -> int:
+
+    """
+    Moves versions with invalid dependencies into invalid versions, repeating until dependents
+    of newly invalidated versions are moved too
+
+    :return: Count of moved versions
+    :rtype: int
+    """
+
+    moved = 0
+
+    while True:
+        result = await conn.execute(_MOVE_INVALID_DEPENDENTS)
+        await conn.execute(_DELETE_INVALID_VERSIONS)
+        if result.rowcount <= 0:
+            return moved
+        moved += result.rowcount
+
+async def _flush(conn: AsyncConnection, table: Table, rows: list[dict]) -> None:
+    await conn.execute(insert(table).on_conflict_do_nothing(), rows)
+
+async def bulk_import(rows: Iterable[tuple[str, dict]], batch_size: int | None = None) -> dict[str, int]:
+
+    """
+    Bulk inserts rows into cache in batches, keeping memory constant. Rows that are already cached are skipped.
+    After the last batch versions depending on invalid versions are moved to invalid versions.
+
+    :param rows: (table name, row) pairs from iter_snapshot or iter_raw_dump
+    :type rows: Iterable[tuple[str, dict]]
+    :return: Processed rows count by table
+    :rtype: dict[str, int]
+    """
+
+    batch_size = batch_size or cfg.IMPORT_BATCH_SIZE
+    tables = {table.name: table for table in BaseORM.metadata.sorted_tables}
+    batches: dict[str, list[dict]] = {name: [] for name in tables}
+    counts: dict[str, int] = {name: 0 for name in tables}
+
+    async with engine.connect() as conn:
+        await conn.execute(text('PRAGMA synchronous = OFF'))
+
+        for table_name, row in rows:
+            if table_name not in tables:
+                raise ValueError(f'Unknown table {table_name}')
+
+            batch = batches[table_name]
+            batch.append(row)
+
+            if len(batch) >= batch_size:
+                await _flush(conn, tables[table_name], batch)
+                counts[table_name] += len(batch)
+                batch.clear()
+                log(f'Imported {counts}')
+
+        for table_name, batch in batches.items():
+            if batch:
+                await _flush(conn, tables[table_name], batch)
+                counts[table_name] += len(batch)
+
+        moved = await _invalidate_dependents(conn)
+        if moved:
+            log(f'Moved {moved} versions with invalid dependencies to invalid versions')
+
+        await conn.execute(text('ANALYZE'))
+        await conn.commit()
+
+        # Safety level can't be changed inside transaction
+        await conn.execute(text('PRAGMA synchronous = FULL'))
+        await conn.commit()
+
+    log(f'Import done {counts}')
+
+    return counts
@@ -0,0 +1,469 @@
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import re
+import tempfile
+import time
+import zipfile
+
+import pytest
+
+from sqlalchemy import func, select
+
+import src.cfg as cfg
+
+# Tests never touch the real cache. Must be set before src.db creates engine
+cfg.DB_URL = f'sqlite+aiosqlite:///{tempfile.mkdtemp()}/test.db'
+
+import src.db as db
+from src.fake_modrinth import FakeModrinth
+from src.manifest import ManifestReader, iter_manifest_hashes, MRPACK_INDEX
+from src.mc_versions import GameVersionIndex
+from src.pack_gen import SyntheticPack, GAME_VERSIONS
+from src.parser import Modrinth
+import src.response as response
+from src.response import is_not_modified
+from src.schemas import ProjectsList, VersionTreeDantic, VersionORM, InvalidVersionORM, VersionFileORM
+from src.snapshot import raw_version_to_rows, iter_raw_dump, iter_snapshot, bulk_import, export_snapshot
+from src.tracing import NoopSpan, start_trace, span
+from src.ver_repo import VerRepo
+
+CHUNK_SIZES = (1, 2, 3, 5, 7, 19, 64, 64 * 1024)
+
+def _run(coro):
+
+    async def run():
+        try:
+            return await coro
+        finally:
+            # Pooled aiosqlite connections are bound to the loop of asyncio.run
+            await db.engine.dispose()
+
+    return asyncio.run(run())
+
+def _sha1(value: str) -> str:
+    return hashlib.sha1(value.encode()).hexdigest()
+
+def _add_project(pack: SyntheticPack, slug: str, versions: list[dict]) -> None:
+
+    project = {
+        'id': f'id-{slug}', 'slug': slug, 'title': slug, 'description': '', 'body': '',
+        'client_side': 'required', 'server_side': 'optional', 'project_type': 'mod',
+        'game_versions': [], 'loaders': [], 'versions': [], 'updated': '2024-01-01T00:00:00Z',
+    }
+
+    for ver in versions:
+        ver.update({'project_id': project['id'], 'files': [{'hashes': {'sha1': _sha1(ver['id'])}}]})
+        project['versions'].append(ver['id'])
+        pack.versions[ver['id']] = ver
+
+    pack.projects[slug] = project
+    pack.slugs.append(slug)
+
+def _version(ver_id: str, game_versions: list[str], loaders: list[str], dependencies: list | None = None) -> dict:
+    return {
+        'id': ver_id, 'name': ver_id, 'version_type': 'release', 'status': 'listed', 'date_published': '2024-01-01', 'project_id': 'id-test',
+        'game_versions': game_versions, 'loaders': loaders, 'dependencies': dependencies or [],
+    }
+
+@pytest.fixture
+def fake_upstream():
+
+    saved = Modrinth.transport, VerRepo._transport
+
+    def install(pack: SyntheticPack) -> FakeModrinth:
+        fake = FakeModrinth(pack, latency=0)
+        Modrinth.transport = VerRepo._transport = fake.transport
+        return fake
+
+    yield install
+
+    Modrinth.transport, VerRepo._transport = saved
+
+FILES = [
+    {'path': 'mods/a.jar', 'hashes': {'sha1': 'AA11', 'sha512': 'bb22'}, 'fileSize': 1024},
+    {'path': 'mods/ünïcode "quoted" \\ path.jar', 'hashes': {'sha1': 'cc33', 'sha512': 'dd44'}, 'env': {'client': 'required', 'server': 'optional'}},
+    {'path': 'mods/c.jar', 'hashes': {'sha1': 'ee55', 'sha512': 'ff66'}, 'downloads': ['https://cdn.modrinth.com/c.jar'], 'fileSize': 1.5e3},
+]
+
+INDEX = {
+    'formatVersion': 1.5,
+    'game': 'minecraft',
+    'versionId': '1.0.0',
+    'name': 'Pack with {braces}, [brackets] and "quotes"',
+    'summary': None,
+    'files': FILES,
+    'dependencies': {'minecraft': '1.20.1', 'fabric-loader': '0.15.0'},
+    'extra': {'nested': [1, -2, 3.25, 4e10, -5.5E-3, True, False, None, {'deep': [[]]}]},
+}
+
+def _read(text: str, chunk_size: int) -> list[dict]:
+    return list(ManifestReader(io.StringIO(text), chunk_size).iter_files())
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_manifest_reader_chunk_sizes(chunk_size):
+    assert _read(json.dumps(INDEX), chunk_size) == FILES
+    assert _read(json.dumps(INDEX, indent=2, ensure_ascii=False), chunk_size) == FILES
+
+@pytest.mark.parametrize('chunk_size', range(1, 40))
+def test_manifest_reader_numbers_split_by_chunks(chunk_size):
+    assert _read('{"formatVersion":1.5,"files":[]}', chunk_size) == []
+    assert _read('{"a":-12.5e+3,"files":[{"size":123456789}],"b":7E-2}', chunk_size) == [{'size': 123456789}]
+
+@pytest.mark.parametrize('chunk_size', (1, 4, 64))
+def test_manifest_reader_empty_and_missing_files(chunk_size):
+    assert _read('{}', chunk_size) == []
+    assert _read(' { "files" : [ ] } ', chunk_size) == []
+    assert _read('{"game":"minecraft"}', chunk_size) == []
+
+@pytest.mark.parametrize('text', ('', '{"files":[{"a":1}', '{"files":[1 2]}', '{"files":[{"a":tru}]}'))
+def test_manifest_reader_invalid(text):
+    with pytest.raises(ValueError):
+        _read(text, 3)
+
+def test_manifest_hashes_with_bom():
+    raw = '\ufeff'.encode() + json.dumps(INDEX).encode()
+    file = io.BytesIO(raw)
+
+    assert list(iter_manifest_hashes(file)) == ['aa11', 'cc33', 'ee55']
+    assert not file.closed
+
+def test_manifest_hashes_from_mrpack():
+    file = io.BytesIO()
+    with zipfile.ZipFile(file, 'w') as archive:
+        archive.writestr(MRPACK_INDEX, '\ufeff'.encode() + json.dumps(INDEX).encode())
+    file.seek(0)
+
+    assert list(iter_manifest_hashes(file, 'sha512')) == ['bb22', 'dd44', 'ff66']
+
+def test_manifest_hashes_missing_algorithm():
+    file = io.BytesIO(json.dumps({'files': [{'path': 'a.jar', 'hashes': {'sha512': 'ab'}}]}).encode())
+
+    with pytest.raises(ValueError):
+        list(iter_manifest_hashes(file))
+
+@pytest.fixture
+def releases():
+    saved = GameVersionIndex.releases()
+    GameVersionIndex.set_releases(['1.16.5', '1.17', '1.17.1', '1.18', '1.18.1', '1.18.2', '1.19', '1.20'])
+    yield
+    GameVersionIndex.set_releases(saved)
+
+def test_to_ranges_collapses_consecutive_releases(releases):
+    assert GameVersionIndex.to_ranges(['1.18.1', '1.17', '1.18', '1.17.1']) == ['1.17–1.18.1']
+    assert GameVersionIndex.to_ranges(['1.20', '1.19', '1.18.2']) == ['1.18.2–1.20']
+
+def test_to_ranges_gaps(releases):
+    assert GameVersionIndex.to_ranges(['1.16.5', '1.17.1', '1.18', '1.20']) == ['1.16.5', '1.17.1–1.18', '1.20']
+
+def test_to_ranges_unknown_and_snapshots(releases):
+    versions = ['1.19', '23w31a', '1.20', '1.20.1-pre1', '1.99']
+    assert GameVersionIndex.to_ranges(versions) == ['1.19–1.20', '1.20.1-pre1', '1.99', '23w31a']
+
+def test_to_ranges_empty(releases):
+    assert GameVersionIndex.to_ranges([]) == []
+
+def test_to_ranges_empty_index(releases):
+    GameVersionIndex.set_releases([])
+    assert GameVersionIndex.to_ranges(['1.20', '1.19']) == ['1.19', '1.20']
+
+@pytest.mark.parametrize('header, expected', [
+    (None, False),
+    ('', False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other"', False),
+    ('"other", "abc"', True),
+    ('"other",W/"abc"', True),
+    ('"ab"', False),
+    ('*', True),
+])
+def test_is_not_modified(header, expected):
+    assert is_not_modified(header, '"abc"') is expected
+
+def test_projects_list_lowercases_hashes():
+    assert ProjectsList(hashes=['AB' * 20, 'cd' * 20]).hashes == ['ab' * 20, 'cd' * 20]
+
+@pytest.mark.parametrize('hashes', (['ab' * 19], ['zz' * 20], ['ab' * 64]))
+def test_projects_list_invalid_hashes(hashes):
+    with pytest.raises(ValueError):
+        ProjectsList(hashes=hashes)
+
+def test_parse_hashes_counts_unusable_files(fake_upstream):
+
+    pack = SyntheticPack()
+    _add_project(pack, 'hashes-a', [_version('hashes-a1', ['1.20.1'], ['fabric'])])
+    _add_project(pack, 'hashes-b', [_version('hashes-b1', ['1.20.1'], ['fabric'])])
+    _add_project(pack, 'hashes-c', [_version('hashes-c1', ['1.12.2'], ['forge'], [{'version_id': None, 'project_id': 'x'}])])
+    fake_upstream(pack)
+
+    usable = [_sha1('hashes-a1'), _sha1('hashes-b1')]
+    invalid = _sha1('hashes-c1')
+    unknown = _sha1('unknown')
+
+    assert _run(Modrinth.parse_hashes(usable)) == {'fabric': {'1.20.1': {'hashes-a1', 'hashes-b1'}}}
+    assert _run(Modrinth.parse_hashes(usable + [unknown])) == {}
+    assert _run(Modrinth.parse_hashes(usable + [invalid])) == {}
+
+def _table_ids(table) -> set[str]:
+
+    async def read():
+        async with db.engine.connect() as conn:
+            return set((await conn.scalars(select(table.id))).all())
+
+    return _run(read())
+
+def _table_counts() -> dict[str, int]:
+
+    async def read():
+        async with db.engine.connect() as conn:
+            return {
+                table.__tablename__: await conn.scalar(select(func.count()).select_from(table))
+                for table in (VersionORM, InvalidVersionORM, VersionFileORM)
+            }
+
+    return _run(read())
+
+def test_raw_version_with_null_dependency_is_invalid():
+    ver = _version('raw-null', ['1.20'], ['fabric'], [{'version_id': None, 'project_id': 'x'}])
+    assert list(raw_version_to_rows(ver)) == [('invalid_versions', {'id': 'raw-null'})]
+
+def test_raw_version_skips_dependency_without_version_id():
+    ver = _version('raw-skip', ['1.20'], ['fabric'], [{'project_id': 'x', 'dependency_type': 'optional'}, {'version_id': 'dep'}])
+    [(table, row)] = list(raw_version_to_rows(ver))
+
+    assert table == 'versions'
+    assert row['dependencies'] == ['dep']
+
+def test_raw_version_lowercases_files_hashes():
+    ver = _version('raw-files', ['1.20'], ['fabric'])
+    ver['files'] = [{'hashes': {'sha1': 'AB' * 20, 'sha512': 'CD' * 64}}]
+
+    rows = list(raw_version_to_rows(ver))
+
+    assert ('version_files', {'hash': 'ab' * 20, 'version_id': 'raw-files'}) in rows
+    assert ('version_files', {'hash': 'cd' * 64, 'version_id': 'raw-files'}) in rows
+
+def test_raw_version_files_response_line():
+    ver = _version('raw-response', ['1.20'], ['fabric'])
+    ver['files'] = [{'hashes': {'sha1': 'ef' * 20}}]
+
+    rows = list(iter_raw_dump([json.dumps({'ef' * 20: ver})]))
+
+    assert ('version_files', {'hash': 'ef' * 20, 'version_id': 'raw-response'}) in rows
+    assert ('versions', 'raw-response') in {(table, row['id']) for table, row in rows if table == 'versions'}
+
+def test_bulk_import_moves_dependents_of_invalid_versions():
+    chain_c = _version('chain-c', ['1.20'], ['fabric'])
+    del chain_c['date_published']
+    lines = [
+        json.dumps(_version('chain-a', ['1.20'], ['fabric'], [{'version_id': 'chain-b'}])),
+        json.dumps([_version('chain-b', ['1.20'], ['fabric'], ['chain-c']), chain_c]),
+        json.dumps(_version('chain-ok', ['1.20'], ['fabric'], [{'version_id': 'chain-outside'}])),
+    ]
+
+    _run(bulk_import(iter_raw_dump(lines), batch_size=1))
+
+    versions = _table_ids(VersionORM)
+    invalid = _table_ids(InvalidVersionORM)
+
+    assert {'chain-a', 'chain-b', 'chain-c'} <= invalid
+    assert not {'chain-a', 'chain-b', 'chain-c'} & versions
+    assert 'chain-ok' in versions
+
+def test_snapshot_round_trip(tmp_path):
+    ver = _version('round-trip', ['1.20'], ['fabric'])
+    ver['files'] = [{'hashes': {'sha1': '12' * 20}}]
+    _run(bulk_import(iter_raw_dump([json.dumps(ver), json.dumps({'id': 'round-trip-invalid'})])))
+
+    before = _table_counts()
+    path = str(tmp_path / 'snapshot.jsonl.gz')
+
+    exported = _run(export_snapshot(path))
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        imported = _run(bulk_import(iter_snapshot(file)))
+
+    assert exported == imported == before
+    assert _table_counts() == before
+
+async def _traced_work(count: int = 3):
+
+    async def child(number: int) -> None:
+        with span('child', number=number):
+            await asyncio.sleep(0.01)
+
+    with start_trace('root') as trace:
+        with span('parent', flag=True, ratio=0.5):
+            await asyncio.gather(*(child(number) for number in range(count)))
+
+    return trace
+
+def test_span_without_trace_is_noop():
+    with span('orphan') as item:
+        item.set(key='value')
+    assert isinstance(item, NoopSpan)
+
+def test_trace_spans_across_gather():
+    trace = asyncio.run(_traced_work())
+    spans = {item.name: item for item in trace.spans if item.name != 'child'}
+    children = [item for item in trace.spans if item.name == 'child']
+
+    assert spans['root'].parent_id is None
+    assert spans['parent'].parent_id == spans['root'].span_id
+    assert len(children) == 3
+    assert all(item.parent_id == spans['parent'].span_id for item in children)
+    assert len({item.task_id for item in children} | {spans['parent'].task_id}) == 4
+    assert all(item.duration_ms > 0 for item in trace.spans)
+
+def test_trace_tracks_of_finished_tasks_are_not_reused():
+
+    async def child(number: int) -> None:
+        with span('child', number=number):
+            pass
+
+    async def work():
+        with start_trace('root') as trace:
+            for number in range(50):
+                # Task of every child is finished and freed before the next one is created, so CPython reuses its id
+                await asyncio.gather(child(number))
+        return trace
+
+    trace = asyncio.run(work())
+    children = [item for item in trace.spans if item.name == 'child']
+
+    assert len({item.task_id for item in children}) == 50
+
+def test_span_captures_error():
+
+    with pytest.raises(ValueError):
+        with start_trace('root') as trace:
+            with span('failing'):
+                raise ValueError('boom')
+
+    errors = {item.name: item.error for item in trace.spans}
+
+    assert errors == {'failing': 'ValueError: boom', 'root': 'ValueError: boom'}
+    assert trace.to_chrome()['traceEvents'][0]['args'] == {'error': 'ValueError: boom'}
+    assert trace.to_otlp()['resourceSpans'][0]['scopeSpans'][0]['spans'][0]['status'] == {'code': 2, 'message': 'ValueError: boom'}
+
+def test_trace_to_chrome():
+    trace = asyncio.run(_traced_work())
+    chrome = trace.to_chrome()
+    events = chrome['traceEvents']
+
+    assert chrome['otherData'] == {'trace_id': trace.trace_id, 'name': 'root'}
+    assert len(events) == 5
+    assert {event['ph'] for event in events} == {'X'}
+    assert min(event['ts'] for event in events) == 0
+    assert all(isinstance(event['tid'], int) and event['dur'] >= 0 for event in events)
+    assert {event['args'].get('number') for event in events if event['name'] == 'child'} == {0, 1, 2}
+    json.dumps(chrome)
+
+def test_trace_to_otlp():
+    trace = asyncio.run(_traced_work())
+    otlp = trace.to_otlp()
+    spans = otlp['resourceSpans'][0]['scopeSpans'][0]['spans']
+    by_name = {item['name']: item for item in spans}
+    hex_id = re.compile('[0-9a-f]+')
+
+    assert len(spans) == 5
+    for item in spans:
+        assert len(item['traceId']) == 32 and hex_id.fullmatch(item['traceId'])
+        assert len(item['spanId']) == 16 and hex_id.fullmatch(item['spanId'])
+        assert int(item['endTimeUnixNano']) >= int(item['startTimeUnixNano'])
+        assert item['status'] == {'code': 1}
+
+    assert 'parentSpanId' not in by_name['root']
+    assert by_name['parent']['parentSpanId'] == by_name['root']['spanId']
+    assert by_name['parent']['attributes'] == [
+        {'key': 'flag', 'value': {'boolValue': True}},
+        {'key': 'ratio', 'value': {'doubleValue': 0.5}},
+    ]
+    child_numbers = {item['attributes'][0]['value']['intValue'] for item in spans if item['name'] == 'child'}
+    assert child_numbers == {'0', '1', '2'}
+    json.dumps(otlp)
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, response.JSON_TYPE),
+    ('', response.JSON_TYPE),
+    ('*/*', response.JSON_TYPE),
+    ('application/json', response.JSON_TYPE),
+    ('application/msgpack', response.MSGPACK_TYPE),
+    ('application/x-msgpack, */*;q=0.1', response.MSGPACK_TYPE),
+    ('application/msgpack, application/json', response.MSGPACK_TYPE),
+    ('application/msgpack;q=0, application/json', response.JSON_TYPE),
+    ('application/msgpack; q=0.0', response.JSON_TYPE),
+    ('application/msgpack;q=0.5, application/json', response.JSON_TYPE),
+    ('application/msgpack;q=0.5, application/*;q=0.2', response.MSGPACK_TYPE),
+    ('application/msgpack;q=bad, application/json', response.JSON_TYPE),
+])
+def test_negotiate(accept, expected):
+    pytest.importorskip('msgpack')
+    assert response.negotiate(accept) == expected
+
+def test_negotiate_without_msgpack(monkeypatch):
+    monkeypatch.setattr(response, 'msgpack', None)
+    assert response.negotiate('application/msgpack') == response.JSON_TYPE
+
+def test_msgpack_response_round_trip():
+    msgpack = pytest.importorskip('msgpack')
+    tree = VersionTreeDantic(data={'fabric': ['1.19–1.20', '1.20.1-pre1'], 'forge': []})
+
+    encoded = response.encode(tree, response.negotiate('application/msgpack'), '"etag"')
+
+    assert encoded.media_type == response.MSGPACK_TYPE
+    assert encoded.headers['etag'] == '"etag"'
+    assert msgpack.unpackb(encoded.body) == json.loads(response.encode(tree, response.JSON_TYPE, '"etag"').body)
+    assert msgpack.unpackb(encoded.body) == {'status': 'ok', 'data': {'fabric': ['1.19–1.20', '1.20.1-pre1'], 'forge': []}}
+
+@pytest.fixture
+def game_versions_upstream():
+
+    saved = GameVersionIndex.releases(), GameVersionIndex._expires_at, GameVersionIndex._transport
+    GameVersionIndex._expires_at = 0.0
+    # Lock is bound to the event loop of the first wait, every asyncio.run has its own loop
+    GameVersionIndex._lock = asyncio.Lock()
+
+    def install(latency: float) -> FakeModrinth:
+        fake = FakeModrinth(SyntheticPack(), latency=latency)
+        GameVersionIndex._transport = fake.transport
+        return fake
+
+    yield install
+
+    releases, GameVersionIndex._expires_at, GameVersionIndex._transport = saved
+    GameVersionIndex.set_releases(releases)
+    GameVersionIndex._refresh_task = None
+
+def test_game_versions_cold_load_is_requested_once(game_versions_upstream):
+    fake = game_versions_upstream(latency=0.05)
+    GameVersionIndex.set_releases([])
+
+    async def load_concurrently():
+        await asyncio.gather(*(GameVersionIndex.load() for _ in range(20)))
+
+    asyncio.run(load_concurrently())
+
+    assert fake.calls['/v2/tag/game_version'] == 1
+    assert GameVersionIndex.releases() == GAME_VERSIONS
+
+def test_game_versions_expired_index_is_refreshed_in_background(game_versions_upstream):
+    fake = game_versions_upstream(latency=0.2)
+    GameVersionIndex.set_releases(['1.16'])
+
+    async def load_concurrently():
+        started = time.perf_counter()
+        await asyncio.gather(*(GameVersionIndex.load() for _ in range(20)))
+        waited = time.perf_counter() - started
+        stale = GameVersionIndex.releases()
+        await GameVersionIndex._refresh_task
+        return waited, stale
+
+    waited, stale = asyncio.run(load_concurrently())
+
+    assert waited < 0.1
+    assert stale == ['1.16']
+    assert fake.calls['/v2/tag/game_version'] == 1
+    assert GameVersionIndex.releases() == GAME_VERSIONS
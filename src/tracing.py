@@ -0,0 +1,253 @@
+import asyncio
+import contextvars
+import json
+import os
+import time
+import uuid
+import weakref
+
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+import src.cfg as cfg
+from src.utility import log
+
+class Span:
+
+    def __init__(self, trace: 'Trace', name: str, parent: 'Span | None', attributes: dict[str, Any]) -> None:
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.depth = parent.depth + 1 if parent else 0
+        self.attributes: dict[str, Any] = dict(attributes)
+        self.task_id = trace.task_id()
+        self.start_ns = time.time_ns()
+        self._start_perf = time.perf_counter_ns()
+        self.duration_ns: int | None = None
+        self.error: str | None = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self) -> None:
+        self.duration_ns = time.perf_counter_ns() - self._start_perf
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.duration_ns or 0) / 1_000_000
+
+class NoopSpan:
+
+    """
+    Returned by `span` when there is no active trace, so instrumented code never has to check
+    """
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+class Trace:
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.spans: list[Span] = []
+        # Keyed by task itself: ids of finished tasks are reused, and unrelated tasks would share a track
+        self._tasks: weakref.WeakKeyDictionary[asyncio.Task, int] = weakref.WeakKeyDictionary()
+        self._task_count = 0
+        self._no_task_id: int | None = None
+
+    def task_id(self) -> int:
+
+        """
+        Maps current asyncio task to a small sequential number.
+        Chrome trace viewer needs overlapping spans from `asyncio.gather` on separate threads to draw them correctly.
+        """
+
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+
+        if task is None:
+            if self._no_task_id is None:
+                self._no_task_id = self._next_task_id()
+            return self._no_task_id
+
+        if task not in self._tasks:
+            self._tasks[task] = self._next_task_id()
+
+        return self._tasks[task]
+
+    def _next_task_id(self) -> int:
+        self._task_count += 1
+        return self._task_count
+
+    def summary(self) -> dict[str, dict[str, float]]:
+
+        """
+        Aggregates finished spans by name: count, total and max duration in milliseconds
+        """
+
+        result: dict[str, dict[str, float]] = {}
+
+        for item in self.spans:
+            stat = result.setdefault(item.name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stat['count'] += 1
+            stat['total_ms'] += item.duration_ms
+            stat['max_ms'] = max(stat['max_ms'], item.duration_ms)
+
+        return result
+
+    def to_chrome(self) -> dict:
+
+        """
+        Exports trace in Chrome trace-event format, readable by chrome://tracing and ui.perfetto.dev
+        """
+
+        if not self.spans:
+            return {'traceEvents': []}
+
+        origin = min(item.start_ns for item in self.spans)
+        events = []
+
+        for item in self.spans:
+            args = dict(item.attributes)
+            if item.error:
+                args['error'] = item.error
+
+            events.append({
+                'name': item.name,
+                'cat': self.name,
+                'ph': 'X',
+                'ts': (item.start_ns - origin) / 1000,
+                'dur': (item.duration_ns or 0) / 1000,
+                'pid': 1,
+                'tid': item.task_id,
+                'args': args,
+            })
+
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'trace_id': self.trace_id, 'name': self.name},
+        }
+
+    @staticmethod
+    def _otlp_value(value: Any) -> dict:
+
+        if isinstance(value, bool):
+            return {'boolValue': value}
+        if isinstance(value, int):
+            return {'intValue': str(value)}
+        if isinstance(value, float):
+            return {'doubleValue': value}
+        return {'stringValue': str(value)}
+
+    def to_otlp(self) -> dict:
+
+        """
+        Exports trace in OTLP/JSON format (ExportTraceServiceRequest), accepted by OpenTelemetry collectors
+        """
+
+        spans = []
+
+        for item in self.spans:
+            otlp_span = {
+                'traceId': self.trace_id,
+                'spanId': item.span_id,
+                'name': item.name,
+                'kind': 1,
+                'startTimeUnixNano': str(item.start_ns),
+                'endTimeUnixNano': str(item.start_ns + (item.duration_ns or 0)),
+                'attributes': [
+                    {'key': key, 'value': self._otlp_value(value)} for key, value in item.attributes.items()
+                ],
+                'status': {'code': 2, 'message': item.error} if item.error else {'code': 1},
+            }
+            if item.parent_id:
+                otlp_span['parentSpanId'] = item.parent_id
+            spans.append(otlp_span)
+
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'minefit'}}]},
+                'scopeSpans': [{'scope': {'name': 'src.tracing'}, 'spans': spans}],
+            }]
+        }
+
+    def save(self, fmt: str = 'chrome', directory: str | None = None) -> str:
+
+        """
+        Writes trace into a file and returns its path
+
+        :param fmt: Export format, `chrome` or `otlp`
+        :type fmt: str
+        :param directory: Output directory, cfg.TRACE_DIR by default
+        :type directory: str | None
+        :return: Path of written file
+        :rtype: str
+        """
+
+        exporters = {'chrome': self.to_chrome, 'otlp': self.to_otlp}
+
+        if fmt not in exporters:
+            raise ValueError(f'Unknown trace format {fmt}')
+
+        directory = directory or cfg.TRACE_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{self.trace_id}.{fmt}.json')
+
+        with open(path, 'w') as file:
+            json.dump(exporters[fmt](), file)
+
+        log(f'Trace saved to {path}')
+
+        return path
+
+_current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar('current_trace', default=None)
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar('current_span', default=None)
+
+@contextmanager
+def start_trace(name: str) -> Iterator[Trace]:
+
+    """
+    Enables tracing for the current context. Every `span` opened inside, including tasks spawned by `asyncio.gather`, is recorded into returned trace.
+    """
+
+    trace = Trace(name)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+
+    try:
+        with span(name):
+            yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | NoopSpan]:
+
+    """
+    Opens nested span in the active trace. Does nothing if tracing is not enabled.
+    """
+
+    trace = _current_trace.get()
+
+    if trace is None:
+        yield NoopSpan()
+        return
+
+    item = Span(trace, name, _current_span.get(), attributes)
+    token = _current_span.set(item)
+
+    try:
+        yield item
+    except BaseException as ex:
+        item.error = f'{type(ex).__name__}: {ex}'
+        raise
+    finally:
+        item.finish()
+        _current_span.reset(token)
+        trace.spans.append(item)
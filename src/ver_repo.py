@@ -9,9 +9,11 @@ from src.db import VerStack, Session
 import src.db as db
 from src.c_exceptions import *
 from src.schemas import *
+from src.tracing import span
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from more_itertools import chunked
+from typing import Callable
 from pydantic import ValidationError
 
 class VerRepo:
@@ -20,6 +22,10 @@ class VerRepo:
     _semaphore = asyncio.Semaphore(20)
 
     _versions_api_url = 'https://api.modrinth.com/v2/versions'
+    _version_files_api_url = 'https://api.modrinth.com/v2/version_files'
+
+    # Replaced by benchmarks with a local fake of Modrinth API. Called with limits of every created client
+    _transport: Callable[..., httpx.AsyncBaseTransport] | None = None
 
     @classmethod
     async def _segment_request(cls, client: httpx.AsyncClient, version_list_segment: list[str]) -> list[dict]:
@@ -38,10 +44,14 @@ class VerRepo:
         
         ids_param = json.dumps(version_list_segment)
 
-        response = await client.get(
-            cls._versions_api_url, 
-            params={'ids': ids_param}
-        )
+        with span('ver_repo.segment_request', ids=len(version_list_segment)) as request_span:
+
+            response = await client.get(
+                cls._versions_api_url, 
+                params={'ids': ids_param}
+            )
+
+            request_span.set(status=response.status_code)
         
         try:
             response.raise_for_status()
@@ -52,6 +62,39 @@ class VerRepo:
 
         return response
 
+    @classmethod
+    async def _version_files_segment_request(cls, client: httpx.AsyncClient, hashes_segment: list[str], algorithm: str) -> dict[str, dict]:
+
+        """
+        Request versions of files by hashes with Modrinth batch endpoint
+        
+        :param client: Client
+        :type client: httpx.AsyncClient
+        :param hashes_segment: List of files hashes
+        :type hashes_segment: list[str]
+        :param algorithm: Hash algorithm, sha1 or sha512
+        :type algorithm: str
+        :return: Versions data by file hash, unknown hashes are omitted
+        :rtype: dict[str, dict]
+        """
+
+        with span('ver_repo.version_files_request', hashes=len(hashes_segment)) as request_span:
+
+            response = await client.post(
+                cls._version_files_api_url,
+                json={'hashes': hashes_segment, 'algorithm': algorithm}
+            )
+
+            request_span.set(status=response.status_code)
+
+        try:
+            response.raise_for_status()
+        except Exception as ex:
+            log(str(ex), True)
+            raise ex
+
+        return response.json()
+
     @classmethod
     async def _ver_stack_check(cls, ver_id_list: list[str], ver_stack: VerStack) -> list[str] | None:
         
@@ -113,10 +156,11 @@ class VerRepo:
             max_keepalive_connections=cfg.KEEP_ALIVE_CONNECTION,
         )
         
-        async with httpx.AsyncClient(timeout=cls._timeout, limits=limits) as client:
-            results = await asyncio.gather(
-                *(cls._segment_request(client, segment) for segment in ver_id_list_segmented)
-            )
+        with span('ver_repo.versions_request', ids=len(ver_id_list), segments=len(ver_id_list_segmented)):
+            async with httpx.AsyncClient(timeout=cls._timeout, limits=limits, transport=cls._transport(limits) if cls._transport else None) as client:
+                results = await asyncio.gather(
+                    *(cls._segment_request(client, segment) for segment in ver_id_list_segmented)
+                )
 
         return results
     
@@ -163,7 +207,7 @@ class VerRepo:
                     break
 
     @classmethod
-    async def add(cls, session: AsyncSession, ver_id_list: list[str], ver_stack: VerStack) -> VerStack:
+    async def add(cls, session: AsyncSession, ver_id_list: list[str], ver_stack: VerStack, depth: int = 0) -> VerStack:
 
         """
         Pipeline to request, validate and add project version to repo.
@@ -173,29 +217,37 @@ class VerRepo:
         :type ver_id_list: list[str]
         :param ver_in_work: Description
         :type ver_in_work: set[str] | None
+        :param depth: Dependency recursion level, used for tracing
+        :type depth: int
         :return: Description
         :rtype: tuple[list[VersionDantic], dict[str, InvalidVersionDantic]]
         """
 
-        
-        ver_id_list_filtered = await cls._ver_stack_check(ver_id_list, ver_stack)
-        
-        if not ver_id_list_filtered:
-            return ver_stack
-        
-        log(f'Fetching {len(ver_id_list_filtered)} versions')
 
-        request_response = await cls._versions_request(ver_id_list)
+        with span('ver_repo.add', depth=depth, ids=len(ver_id_list)) as add_span:
 
-        await cls._ver_stack_enrich(request_response, ver_stack)
-        
-        dep_id_list = list(set(await cls._dep_ids_aggregate(ver_stack)))
+            ver_id_list_filtered = await cls._ver_stack_check(ver_id_list, ver_stack)
 
-        log(f'{len(dep_id_list)} dependencies')
+            add_span.set(to_fetch=len(ver_id_list_filtered))
+            
+            if not ver_id_list_filtered:
+                return ver_stack
+            
+            log(f'Fetching {len(ver_id_list_filtered)} versions')
 
-        await cls.add(session, dep_id_list, ver_stack)
-        
-        await cls._filter_invalid_vers_by_deps(ver_stack)
+            request_response = await cls._versions_request(ver_id_list)
+
+            await cls._ver_stack_enrich(request_response, ver_stack)
+            
+            dep_id_list = list(set(await cls._dep_ids_aggregate(ver_stack)))
+
+            add_span.set(dependencies=len(dep_id_list))
+
+            log(f'{len(dep_id_list)} dependencies')
+
+            await cls.add(session, dep_id_list, ver_stack, depth + 1)
+            
+            await cls._filter_invalid_vers_by_deps(ver_stack)
 
         return ver_stack
         
@@ -208,9 +260,11 @@ class VerRepo:
 
         ver_stack = VerStack()
 
-        await asyncio.gather(
-            *(db.enrich_ver_stack(segment, ver_stack) for segment in ver_id_segmented)
-        )
+        with span('ver_repo.cache_lookup', ids=len(ver_id_list), segments=len(ver_id_segmented)) as lookup_span:
+            await asyncio.gather(
+                *(db.enrich_ver_stack(segment, ver_stack) for segment in ver_id_segmented)
+            )
+            lookup_span.set(parsed_hits=len(ver_stack.parsed), invalid_hits=len(ver_stack.invalid))
         
         log(f'Got {len(ver_stack.parsed)} saved')
         log(f'Got {len(ver_stack.invalid)} invalid')
@@ -227,10 +281,74 @@ class VerRepo:
 
         if remain:
             async with Session() as session:
-                await cls.add(session, remain, ver_stack)
+                with span('ver_repo.fetch_missing', ids=len(remain)):
+                    await cls.add(session, remain, ver_stack)
                 session_data = list(ver_stack.parsed.values()) + list(ver_stack.invalid.values())
                 log(f'Cached {len(ver_stack.parsed)} parsed versions and {len(ver_stack.invalid)} invalid versions')
                 await db.add_versions_to_session(session, session_data)
                 await db.commit_changes(session)
 
-        return ver_stack
\ No newline at end of file
+        return ver_stack
+
+    @classmethod
+    async def get_by_hashes(cls, hashes: list[str], algorithm: str) -> tuple[VerStack, dict[str, str]]:
+
+        """
+        Resolves files hashes to exact versions. Hashes resolved before are taken from db,
+        others are requested with batch version files endpoint. Missing dependencies are pulled with `get`.
+        
+        :param hashes: Files hashes
+        :type hashes: list[str]
+        :param algorithm: Hash algorithm, sha1 or sha512
+        :type algorithm: str
+        :return: Versions stack and file hash -> version id mapping of resolved files
+        :rtype: tuple[VerStack, dict[str, str]]
+        """
+
+        with span('ver_repo.files_cache_lookup', hashes=len(hashes)) as lookup_span:
+            files = await db.get_version_files(hashes)
+            lookup_span.set(hits=len(files))
+
+        remain = [file_hash for file_hash in hashes if file_hash not in files]
+
+        log(f'{len(files)} files hashes cached, {len(remain)} missing in db')
+
+        ver_stack = VerStack()
+        new_files: dict[str, str] = {}
+
+        if remain:
+            async with httpx.AsyncClient(timeout=cls._timeout, transport=cls._transport() if cls._transport else None) as client:
+                results = await asyncio.gather(
+                    *(cls._version_files_segment_request(client, segment, algorithm) for segment in chunked(remain, cfg.BULK_SEGMENT_SIZE))
+                )
+
+            for segment in results:
+                new_files.update({file_hash: ver.get('id', 'null') for file_hash, ver in segment.items()})
+
+            await cls._ver_stack_enrich([list(segment.values()) for segment in results], ver_stack)
+
+            log(f'Resolved {len(new_files)} of {len(remain)} files hashes')
+
+        files.update(new_files)
+
+        known = set(ver_stack.parsed) | set(ver_stack.invalid)
+        dep_ids = {dep for ver in ver_stack.parsed.values() for dep in ver.dependencies}
+        missing = (set(files.values()) | dep_ids) - known
+
+        if missing:
+            missing_stack = await cls.get(missing)
+            ver_stack.parsed.update(missing_stack.parsed)
+            ver_stack.invalid.update(missing_stack.invalid)
+
+        await cls._filter_invalid_vers_by_deps(ver_stack)
+
+        if new_files:
+            new_ids = set(new_files.values())
+            session_data = [ver for ver in list(ver_stack.parsed.values()) + list(ver_stack.invalid.values()) if ver.id in new_ids]
+
+            async with Session() as session:
+                await db.add_versions_to_session(session, session_data)
+                await db.add_version_files_to_session(session, new_files)
+                await db.commit_changes(session)
+
+        return ver_stack, files
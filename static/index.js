@@ -16,15 +16,29 @@ urls_list.addEventListener("input", () => {
 
 });
 
+// Длинные списки не помещаются в строку запроса
+const MAX_QUERY_LENGTH = 4000;
+
+function requestProjects(text) {
+    const query = new URLSearchParams({ text }).toString();
+
+    if (query.length <= MAX_QUERY_LENGTH) {
+        // GET с ETag: браузер сам отправит If-None-Match и получит 304 для того же набора проектов
+        return fetch(`/projects?${query}`, { cache: "no-cache" });
+    }
+
+    return fetch("/projects", {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json",
+        },
+        body: JSON.stringify({ text }),
+    });
+}
+
 async function sendText(text) {
     try {
-        const response = await fetch("/projects", {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json",
-            },
-            body: JSON.stringify({ text }),
-        });
+        const response = await requestProjects(text);
 
         if (response.ok) {
             // Сервер вернул 200-299